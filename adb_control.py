@@ -6,45 +6,111 @@ ADB控制模块
 """
 
 import os
+import asyncio
 import subprocess
+import threading
 import time
+import random
 import re
-from typing import Optional, Tuple, List
+import shlex
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple, List, Union
+
+import cv2
+import numpy as np
+
+from adb_utils import (backoff_delay, RawScreencapReader, ScreencapStream, ShellSession, Throttle, TokenBucket,
+                       RETRY_BASE_ERROR, RETRY_BASE_TIMEOUT)
+from minicap_backend import MinicapBackend
+
+# 设备状态查询命令
+_POWER_STATE_CMD = "dumpsys power | grep mWakefulness"
+_ACTIVITY_STATE_CMD = "dumpsys activity activities 2>/dev/null | grep mResumedActivity"
+
+# 设备状态缓存有效期（秒）
+STATE_CACHE_TTL = 0.5
+
+# 命令输出解析用的正则，导入时编译一次
+_SHORT_SIZE_RE = re.compile(r'(\d+)x(\d+)')
+_VERSION_RE = re.compile(r'versionName=(\S+)')
 
 class ADBController:
     """ADB控制器类"""
     
-    def __init__(self, adb_path: str = "adb", device_id: str = "", logger=None):
+    def __init__(self, adb_path: str = "adb", device_id: str = "", logger=None,
+                 default_jitter: Tuple[float, float] = (0.0, 0.0), fast_mode: bool = False,
+                 screenshot_interval: float = 0.3, fast_capture: bool = False,
+                 minicap_dir: str = "minicap", frame_slots: int = 0):
         """初始化ADB控制器
         
         Args:
             adb_path: ADB工具路径
             device_id: 设备ID，空字符串表示自动选择
             logger: 日志对象
+            default_jitter: 未指定delay时操作后的随机延迟范围（秒），(0, 0)表示不延迟
+            fast_mode: 快速模式，跳过所有操作后延迟
+            screenshot_interval: 两次截图之间的最小间隔（秒），0表示不限速
+            fast_capture: 是否使用minicap帧流截图，启动失败时自动退回screencap
+            minicap_dir: 本地minicap预编译文件目录
+            frame_slots: 原始截图复用的输出缓冲区数量，0表示每帧分配新数组；
+                启用时返回的图像会在之后第frame_slots次截图时被覆盖，
+                调用方同时持有的帧数不能超过该值
         """
         self.adb_path = adb_path
         self.device_id = device_id
         self.logger = logger
-        self.last_screenshot_time = 0
+        self.default_jitter = default_jitter
+        self.fast_mode = fast_mode
+        self._shot_throttle = Throttle(screenshot_interval)
+        self.frame_slots = frame_slots
+        self._raw_reader = RawScreencapReader(frame_slots)
+        
+        # 常驻截图通道，首次截图时启动
+        self._capture_stream = None
+        self.fast_capture = fast_capture
+        self.minicap_dir = minicap_dir
+        self._minicap = None
+        
+        # 常驻shell会话，首次执行shell命令时启动
+        self._shell = None
+        
+        # 重试令牌桶，设备持续不可用时限制重试频率
+        self._retry_tokens = TokenBucket(capacity=10, refill_per_sec=1)
+        
+        # 并行执行互不依赖的查询命令（受USB I/O限制，线程即可并行）
+        self._pool = ThreadPoolExecutor(max_workers=3)
+        
+        # 启动活动缓存: 包名 -> "包名/活动名"
+        self._launcher_activity: Dict[str, str] = {}
         
-    def _run_cmd(self, cmd: str, timeout: int = 5, retry: int = 1) -> Optional[str]:
+        # 设备状态缓存: 查询命令 -> (输出, 过期时间)
+        self._state_cache: Dict[str, Tuple[str, float]] = {}
+        
+        # 屏幕尺寸缓存，会话内不变，仅在重新检查连接时失效
+        self._screen_size: Optional[Tuple[int, int]] = None
+        
+    @property
+    def _base_argv(self) -> List[str]:
+        """ADB命令前缀（含设备ID）"""
+        if self.device_id:
+            return [self.adb_path, "-s", self.device_id]
+        return [self.adb_path]
+    
+    def _run_cmd(self, cmd: Union[str, List[str]], timeout: int = 5, retry: int = 1) -> Optional[str]:
         """运行ADB命令
         
         Args:
-            cmd: 要运行的命令
+            cmd: 要运行的命令（字符串或参数列表）
             timeout: 超时时间（秒）
             retry: 重试次数
             
         Returns:
             命令输出，失败返回None
         """
-        full_cmd = f"{self.adb_path}"
-        
-        # 添加设备ID
-        if self.device_id:
-            full_cmd += f" -s {self.device_id}"
-        
-        full_cmd += f" {cmd}"
+        # 以参数列表运行，不经过系统shell解析
+        argv = self._base_argv + (shlex.split(cmd) if isinstance(cmd, str) else list(cmd))
+        full_cmd = " ".join(argv)
         
         for attempt in range(retry + 1):
             try:
@@ -52,38 +118,152 @@ class ADBController:
                 
                 # 运行命令
                 result = subprocess.run(
-                    full_cmd, 
-                    shell=True, 
+                    argv, 
                     capture_output=True, 
-                    text=True, 
                     timeout=timeout
                 )
                 
                 if result.returncode == 0:
-                    return result.stdout.strip()
+                    self._retry_tokens.refund(1)
+                    return result.stdout.decode('utf-8', errors='replace').strip()
                 else:
                     self.logger.error(f"ADB命令失败: {full_cmd}")
-                    self.logger.error(f"错误输出: {result.stderr.strip()}")
-                    
-                    # 重试逻辑
-                    if attempt < retry:
-                        self.logger.info(f"第 {attempt + 1} 次重试...")
-                        time.sleep(1)
-                        continue
+                    self.logger.error(f"错误输出: {result.stderr.decode('utf-8', errors='replace').strip()}")
+                    base = RETRY_BASE_ERROR
             except subprocess.TimeoutExpired:
                 self.logger.error(f"ADB命令超时: {full_cmd}")
+                base = RETRY_BASE_TIMEOUT
             except Exception as e:
                 self.logger.error(f"运行ADB命令时出错: {str(e)}")
+                base = RETRY_BASE_ERROR
+            
+            # 重试逻辑
+            if not self._wait_retry(attempt, retry, base):
+                break
         
         return None
     
+    def _wait_retry(self, attempt: int, retry: int, base: float) -> bool:
+        """失败后按指数退避等待重试
+        
+        Args:
+            attempt: 当前尝试序号（从0开始）
+            retry: 重试次数
+            base: 基础退避时间（秒）
+            
+        Returns:
+            需要继续重试返回True，否则返回False
+        """
+        if attempt >= retry:
+            return False
+        
+        if not self._retry_tokens.take(1):
+            self.logger.warning("重试令牌已耗尽，放弃重试")
+            return False
+        
+        delay = backoff_delay(attempt, base)
+        self.logger.info(f"第 {attempt + 1} 次重试（{delay:.2f}秒后）...")
+        time.sleep(delay)
+        return True
+    
+    def _shell_cmd(self, cmd: str, timeout: int = 5, retry: int = 1) -> Optional[str]:
+        """在常驻shell会话中运行设备端命令
+        
+        Args:
+            cmd: 设备端shell命令
+            timeout: 超时时间（秒）
+            retry: 重试次数
+            
+        Returns:
+            命令输出，失败返回None
+        """
+        # 首次调用时创建会话；设备切换后旧设备的会话、缓存和截图通道一并关闭再重建
+        if self._shell is None or self._shell.device_id != self.device_id:
+            if self._shell is not None:
+                self._screen_size = None
+                self._state_cache.clear()
+                self.close()
+            self._shell = ShellSession(self.adb_path, self.device_id)
+        
+        for attempt in range(retry + 1):
+            try:
+                self.logger.debug(f"运行shell命令: {cmd}")
+                
+                returncode, output = self._shell.run(cmd, timeout=timeout)
+                
+                if returncode == 0:
+                    self._retry_tokens.refund(1)
+                    return output.strip()
+                else:
+                    self.logger.error(f"shell命令失败: {cmd}")
+                    self.logger.error(f"错误输出: {output.strip()}")
+                    base = RETRY_BASE_ERROR
+            except subprocess.TimeoutExpired:
+                self.logger.error(f"shell命令超时: {cmd}")
+                base = RETRY_BASE_TIMEOUT
+            except Exception as e:
+                self.logger.error(f"运行shell命令时出错: {str(e)}")
+                base = RETRY_BASE_ERROR
+            
+            # 重试逻辑
+            if not self._wait_retry(attempt, retry, base):
+                break
+        
+        return None
+    
+    def _run_batch(self, cmds: List[str], timeout: int = 5) -> Optional[List[str]]:
+        """在一次shell调用中顺序执行多条命令
+        
+        各命令输出以分隔行隔开，单条命令失败不影响其余命令
+        
+        Args:
+            cmds: 设备端shell命令列表
+            timeout: 超时时间（秒）
+            
+        Returns:
+            与cmds一一对应的输出列表，失败返回None
+        """
+        separator = "__SEP__"
+        joined = "".join(f"{cmd}; echo {separator}; " for cmd in cmds) + "true"
+        output = self._shell_cmd(joined, timeout=timeout)
+        if output is None:
+            return None
+        
+        sections = output.split(separator)
+        return [section.strip() for section in sections[:len(cmds)]]
+    
+    def close(self):
+        """关闭常驻shell会话及minicap"""
+        if self._shell is not None:
+            self._shell.close()
+            self._shell = None
+        
+        if self._capture_stream is not None:
+            self._capture_stream.close()
+            self._capture_stream = None
+        
+        if self._minicap is not None:
+            self._minicap.stop()
+            self._minicap = None
+    
     def get_devices(self) -> List[str]:
         """获取连接的设备列表
         
         Returns:
             设备ID列表
         """
-        output = self._run_cmd("devices")
+        return self._parse_devices(self._run_cmd("devices"))
+    
+    @staticmethod
+    def _parse_devices(output: Optional[str]) -> List[str]:
+        """解析 `adb devices` 输出
+        
+        Args:
+            output: 命令输出
+            
+        Returns:
+            在线设备ID列表
+        """
         if not output:
             return []
         
@@ -103,6 +283,8 @@ class ADBController:
         Returns:
             连接正常返回True，否则返回False
         """
+        self._screen_size = None
+        
         # 如果未指定设备ID，尝试自动选择
         if not self.device_id:
             devices = self.get_devices()
@@ -114,9 +296,168 @@ class ADBController:
             self.device_id = devices[0]
             self.logger.info(f"自动选择设备: {self.device_id}")
         
-        # 检查设备是否在线
-        output = self._run_cmd("shell echo 'test'")
-        return output == "test"
+        # 在线检查与屏幕尺寸查询互不依赖，并行执行（尺寸查询走独立adb进程）
+        size_future = self._pool.submit(self._run_cmd, ["shell", "wm", "size"])
+        output = self._shell_cmd("echo 'test'")
+        size_output = size_future.result()
+        if output != "test":
+            return False
+        
+        # 缓存屏幕尺寸，后续操作不再查询
+        self._screen_size = self._parse_screen_size(size_output)
+        return True
+    
+    def screenshot_bytes(self, timeout: int = 5, png: bool = False) -> Optional[bytes]:
+        """以原始格式截取屏幕
+        
+        通过 `exec-out screencap` 直接读取像素数据，不经过设备存储
+        
+        Args:
+            timeout: 超时时间（秒）
+            png: 是否输出PNG编码数据
+            
+        Returns:
+            screencap原始输出，失败返回None
+        """
+        argv = self._base_argv + ["exec-out", "screencap"]
+        if png:
+            argv.append("-p")
+        
+        try:
+            proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                data, err = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                self.logger.error("截图超时")
+                return None
+        except Exception as e:
+            self.logger.error(f"截图命令执行错误: {str(e)}")
+            return None
+        
+        if proc.returncode != 0 or not data:
+            self.logger.error(f"截图失败: {err.decode(errors='replace').strip()}")
+            return None
+        
+        return data
+    
+    def _read_stream_frame(self, grayscale: bool = False) -> Optional[np.ndarray]:
+        """通过常驻截图通道读取一帧
+        
+        Args:
+            grayscale: 是否直接输出灰度图
+            
+        Returns:
+            BGR图像数组，失败返回None
+        """
+        if self._capture_stream is None or self._capture_stream.device_id != self.device_id:
+            if self._capture_stream is not None:
+                self._capture_stream.close()
+            self._capture_stream = ScreencapStream(self.adb_path, self.device_id, self.frame_slots)
+        
+        try:
+            return self._capture_stream.capture(grayscale=grayscale)
+        except Exception as e:
+            self.logger.debug(f"常驻截图通道失败: {str(e)}")
+            return None
+    
+    def _read_raw_frame(self, timeout: int = 5, grayscale: bool = False) -> Optional[np.ndarray]:
+        """从 `exec-out screencap` 管道直接读取一帧到复用缓冲区
+        
+        Args:
+            timeout: 超时时间（秒）
+            grayscale: 是否直接输出灰度图
+            
+        Returns:
+            BGR图像数组，失败返回None
+        """
+        argv = self._base_argv + ["exec-out", "screencap"]
+        
+        try:
+            proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            self.logger.error(f"截图命令执行错误: {str(e)}")
+            return None
+        
+        # 读取阻塞时由定时器结束进程
+        killer = threading.Timer(timeout, proc.kill)
+        killer.start()
+        try:
+            return self._raw_reader.read(proc.stdout, grayscale=grayscale)
+        finally:
+            killer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+    
+    def screenshot_array(self, grayscale: bool = False) -> Optional[np.ndarray]:
+        """截取屏幕并直接返回图像数组
+        
+        Args:
+            grayscale: 是否直接输出灰度图（每像素1字节，后续处理数据量更小）
+            
+        Returns:
+            BGR（或灰度）图像数组，失败返回None
+        """
+        try:
+            # minicap帧流已常驻推送，无需限速
+            if self.fast_capture:
+                image = self._minicap_frame(grayscale)
+                if image is not None:
+                    return image
+            
+            # 检查截图频率，避免过于频繁
+            self._shot_throttle.wait()
+            
+            # 优先使用常驻截图通道，失败时退回一次性截图
+            image = self._read_stream_frame(grayscale)
+            if image is not None:
+                return image
+            
+            image = self._read_raw_frame(grayscale=grayscale)
+            if image is not None:
+                return image
+            
+            # 原始格式无法解析时退回PNG格式
+            data = self.screenshot_bytes(png=True)
+            if data is None:
+                return None
+            
+            flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+            if image is None:
+                self.logger.error("无法解析截图数据")
+            return image
+        except Exception as e:
+            self.logger.error(f"截图失败: {str(e)}")
+            return None
+    
+    def _minicap_frame(self, grayscale: bool = False) -> Optional[np.ndarray]:
+        """从minicap获取最新帧，首次调用时启动minicap
+        
+        Args:
+            grayscale: 是否直接输出灰度图
+            
+        Returns:
+            BGR图像数组，失败返回None
+        """
+        if self._minicap is None or not self._minicap.is_running():
+            size = self.get_screen_size()
+            if size is None:
+                return None
+            
+            if self._minicap is not None:
+                self._minicap.stop()
+            self._minicap = MinicapBackend(self.adb_path, self.device_id, self.minicap_dir, logger=self.logger)
+            if not self._minicap.start(*size):
+                self.logger.warning("minicap启动失败，退回screencap截图")
+                self.fast_capture = False
+                self._minicap = None
+                return None
+        
+        return self._minicap.get_frame(grayscale=grayscale)
     
     def screenshot(self, save_path: str = "screenshot.png") -> Optional[str]:
         """截取屏幕
@@ -129,45 +470,74 @@ class ADBController:
         """
         try:
             # 检查截图频率，避免过于频繁
-            current_time = time.time()
-            if current_time - self.last_screenshot_time < 0.3:
-                time.sleep(0.3 - (current_time - self.last_screenshot_time))
-            
-            # 使用ADB截图
-            temp_path = "/sdcard/screenshot.png"
-            cmd = f"shell screencap -p {temp_path}"
-            
-            if self._run_cmd(cmd, timeout=3):
-                # 拉取截图到本地
-                cmd = f"pull {temp_path} {save_path}"
-                if self._run_cmd(cmd, timeout=5):
-                    # 删除设备上的临时文件
-                    self._run_cmd(f"shell rm {temp_path}", timeout=2)
-                    self.last_screenshot_time = time.time()
-                    return save_path
+            self._shot_throttle.wait()
             
-            return None
+            # 设备端PNG输出直接写入本地文件，本地无需解码再编码
+            argv = self._base_argv + ["exec-out", "screencap", "-p"]
+            with open(save_path, 'wb') as f:
+                result = subprocess.run(argv, stdout=f, stderr=subprocess.PIPE, timeout=5)
+            
+            if result.returncode != 0 or os.path.getsize(save_path) == 0:
+                self.logger.error(f"保存截图失败: {result.stderr.decode(errors='replace').strip()}")
+                return None
+            
+            return save_path
         except Exception as e:
             self.logger.error(f"截图失败: {str(e)}")
             return None
     
-    def tap(self, x: int, y: int, delay: float = 0.1) -> bool:
+    def _post_action_delay(self, delay: Optional[float]):
+        """操作后延迟
+        
+        Args:
+            delay: 延迟时间（秒），None表示使用default_jitter范围内的随机延迟
+        """
+        if self.fast_mode:
+            return
+        
+        if delay is None:
+            low, high = self.default_jitter
+            if high <= 0:
+                return
+            delay = random.uniform(low, high)
+        
+        if delay > 0:
+            time.sleep(delay)
+    
+    def tap(self, x: int, y: int, delay: Optional[float] = None) -> bool:
         """点击屏幕
         
         Args:
             x: X坐标
             y: Y坐标
-            delay: 点击延迟（秒）
+            delay: 点击延迟（秒），None表示使用默认随机延迟
             
         Returns:
             成功返回True，失败返回False
         """
-        cmd = f"shell input tap {x} {y}"
-        result = self._run_cmd(cmd, timeout=2)
-        time.sleep(delay)
+        cmd = f"input tap {x} {y}"
+        result = self._shell_cmd(cmd, timeout=2)
+        self._post_action_delay(delay)
         return result is not None
     
-    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 500, delay: float = 0.1) -> bool:
+    def tap_batch(self, points: List[Tuple[int, int, float]]) -> bool:
+        """一次shell调用连续点击多个位置
+        
+        Args:
+            points: (x, y, 点击后等待秒数) 列表，等待在设备端执行
+            
+        Returns:
+            成功返回True，失败返回False
+        """
+        if not points:
+            return True
+        
+        cmd = "; ".join(f"input tap {x} {y}; sleep {wait}" if wait > 0 else f"input tap {x} {y}"
+                        for x, y, wait in points)
+        timeout = 5 + sum(wait for _, _, wait in points)
+        return self._shell_cmd(cmd, timeout=timeout) is not None
+    
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 500, delay: Optional[float] = None) -> bool:
         """滑动屏幕
         
         Args:
@@ -176,45 +546,61 @@ class ADBController:
             x2: 结束X坐标
             y2: 结束Y坐标
             duration: 滑动持续时间（毫秒）
-            delay: 操作延迟（秒）
+            delay: 操作延迟（秒），None表示使用默认随机延迟
             
         Returns:
             成功返回True，失败返回False
         """
-        cmd = f"shell input swipe {x1} {y1} {x2} {y2} {duration}"
-        result = self._run_cmd(cmd, timeout=3)
-        time.sleep(delay)
+        cmd = f"input swipe {x1} {y1} {x2} {y2} {duration}"
+        result = self._shell_cmd(cmd, timeout=3)
+        self._post_action_delay(delay)
         return result is not None
     
-    def long_press(self, x: int, y: int, duration: int = 1000, delay: float = 0.1) -> bool:
+    def long_press(self, x: int, y: int, duration: int = 1000, delay: Optional[float] = None) -> bool:
         """长按屏幕
         
         Args:
             x: X坐标
             y: Y坐标
             duration: 长按持续时间（毫秒）
-            delay: 操作延迟（秒）
+            delay: 操作延迟（秒），None表示使用默认随机延迟
             
         Returns:
             成功返回True，失败返回False
         """
         return self.swipe(x, y, x, y, duration, delay)
     
-    def get_screen_size(self) -> Optional[Tuple[int, int]]:
-        """获取屏幕尺寸
+    def get_screen_size(self, refresh: bool = False) -> Optional[Tuple[int, int]]:
+        """获取屏幕尺寸（结果会被缓存）
         
+        Args:
+            refresh: 是否忽略缓存重新查询
+            
         Returns:
             (width, height) 元组，失败返回None
         """
-        output = self._run_cmd("shell wm size")
+        if self._screen_size is not None and not refresh:
+            return self._screen_size
+        
+        self._screen_size = self._parse_screen_size(self._shell_cmd("wm size"))
+        return self._screen_size
+    
+    @staticmethod
+    def _parse_screen_size(output: Optional[str]) -> Optional[Tuple[int, int]]:
+        """解析 `wm size` 输出
+        
+        Args:
+            output: 命令输出，例如: Physical size: 1080x2340
+            
+        Returns:
+            (width, height) 元组，解析失败返回None
+        """
         if not output:
             return None
         
-        # 解析输出，例如: Physical size: 1080x2340
-        match = re.search(r'\d+x\d+', output)
+        match = _SHORT_SIZE_RE.search(output)
         if match:
-            size = match.group(0).split('x')
-            return (int(size[0]), int(size[1]))
+            return (int(match.group(1)), int(match.group(2)))
         
         return None
     
@@ -225,7 +611,7 @@ class ADBController:
             成功返回True，失败返回False
         """
         # 发送电源键事件
-        return self._run_cmd("shell input keyevent 26") is not None
+        return self._shell_cmd("input keyevent 26") is not None
     
     def unlock_screen(self) -> bool:
         """解锁屏幕
@@ -258,8 +644,55 @@ class ADBController:
             self.logger.error(f"APK文件不存在: {apk_path}")
             return False
         
-        cmd = f"install -r {apk_path}"
-        return self._run_cmd(cmd, timeout=60, retry=2) is not None
+        # 通过stdin流式传输APK，重试时只需回到文件开头，不重新打开文件
+        size = os.path.getsize(apk_path)
+        argv = self._base_argv + ["install", "-r", "-S", str(size), "-"]
+        retry = 2
+        
+        with open(apk_path, 'rb') as apk:
+            for attempt in range(retry + 1):
+                apk.seek(0)
+                try:
+                    self.logger.debug(f"安装APK: {apk_path} ({size} 字节)")
+                    
+                    proc = subprocess.Popen(
+                        argv,
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT
+                    )
+                    try:
+                        # 1 MiB缓冲，减少USB传输包数量
+                        shutil.copyfileobj(apk, proc.stdin, length=1 << 20)
+                        proc.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                    
+                    try:
+                        proc.wait(timeout=120)
+                    except subprocess.TimeoutExpired:
+                        proc.kill()
+                        proc.wait()
+                        raise
+                    
+                    output = proc.stdout.read().decode('utf-8', errors='replace').strip()
+                    if proc.returncode == 0 and "Success" in output:
+                        self._retry_tokens.refund(1)
+                        return True
+                    
+                    self.logger.error(f"安装APK失败: {output}")
+                    base = RETRY_BASE_ERROR
+                except subprocess.TimeoutExpired:
+                    self.logger.error(f"安装APK超时: {apk_path}")
+                    base = RETRY_BASE_TIMEOUT
+                except Exception as e:
+                    self.logger.error(f"安装APK时出错: {str(e)}")
+                    base = RETRY_BASE_ERROR
+                
+                if not self._wait_retry(attempt, retry, base):
+                    break
+        
+        return False
     
     def get_package_version(self, package_name: str) -> Optional[str]:
         """获取应用版本
@@ -270,10 +703,10 @@ class ADBController:
         Returns:
             版本号，失败返回None
         """
-        cmd = f"shell dumpsys package {package_name} | grep versionName"
-        output = self._run_cmd(cmd)
+        cmd = f"dumpsys package {package_name} | grep versionName"
+        output = self._shell_cmd(cmd)
         if output:
-            match = re.search(r'versionName=(.*)', output)
+            match = _VERSION_RE.search(output)
             if match:
                 return match.group(1)
         
@@ -288,8 +721,8 @@ class ADBController:
         Returns:
             成功返回True，失败返回False
         """
-        cmd = f"shell am force-stop {package_name}"
-        return self._run_cmd(cmd) is not None
+        cmd = f"am force-stop {package_name}"
+        return self._shell_cmd(cmd) is not None
     
     def start_activity(self, package_name: str, activity_name: str) -> bool:
         """启动应用活动
@@ -301,8 +734,99 @@ class ADBController:
         Returns:
             成功返回True，失败返回False
         """
-        cmd = f"shell am start -n {package_name}/{activity_name}"
-        return self._run_cmd(cmd) is not None
+        cmd = f"am start -n {package_name}/{activity_name}"
+        return self._shell_cmd(cmd) is not None
+    
+    def resolve_launcher_activity(self, package_name: str) -> Optional[str]:
+        """解析应用的启动活动（结果按包名缓存）
+        
+        Args:
+            package_name: 包名
+            
+        Returns:
+            "包名/活动名" 形式的组件名，失败返回None
+        """
+        if package_name in self._launcher_activity:
+            return self._launcher_activity[package_name]
+        
+        cmd = f"cmd package resolve-activity --brief -c android.intent.category.LAUNCHER {package_name}"
+        output = self._shell_cmd(cmd)
+        if not output:
+            return None
+        
+        # 输出最后一行为组件名，例如: com.example/.MainActivity
+        component = output.splitlines()[-1].strip()
+        if "/" not in component:
+            return None
+        
+        self._launcher_activity[package_name] = component
+        return component
+    
+    def get_device_state(self, package_name: str) -> Tuple[bool, bool]:
+        """一次shell调用同时查询屏幕状态与前台应用
+        
+        Args:
+            package_name: 包名
+            
+        Returns:
+            (屏幕是否开启, 应用是否在前台)
+        """
+        power_output = self._cached_state(_POWER_STATE_CMD)
+        activity_output = self._cached_state(_ACTIVITY_STATE_CMD)
+        
+        if power_output is None or activity_output is None:
+            outputs = self._run_batch([_POWER_STATE_CMD, _ACTIVITY_STATE_CMD])
+            if outputs is None:
+                return False, False
+            
+            power_output, activity_output = outputs
+            self._store_state(_POWER_STATE_CMD, power_output)
+            self._store_state(_ACTIVITY_STATE_CMD, activity_output)
+        
+        return "Awake" in power_output, package_name in activity_output
+    
+    def _cached_state(self, cmd: str) -> Optional[str]:
+        """读取未过期的状态查询结果
+        
+        Args:
+            cmd: 状态查询命令
+            
+        Returns:
+            缓存的命令输出，不存在或已过期返回None
+        """
+        entry = self._state_cache.get(cmd)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        return None
+    
+    def _store_state(self, cmd: str, output: str):
+        """缓存状态查询结果
+        
+        Args:
+            cmd: 状态查询命令
+            output: 命令输出
+        """
+        self._state_cache[cmd] = (output, time.monotonic() + STATE_CACHE_TTL)
+    
+    def _query_state(self, cmd: str) -> Optional[str]:
+        """执行状态查询，短时间内重复查询直接返回缓存结果
+        
+        Args:
+            cmd: 状态查询命令
+            
+        Returns:
+            命令输出，失败返回None
+        """
+        output = self._cached_state(cmd)
+        if output is None:
+            output = self._shell_cmd(cmd)
+            if output is not None:
+                self._store_state(cmd, output)
+        return output
+    
+    def invalidate_state(self):
+        """清空设备状态缓存（设备状态可能改变的操作之后调用）"""
+        self._state_cache.clear()
     
     def is_package_in_foreground(self, package_name: str) -> bool:
         """检查应用是否在前台运行
@@ -314,8 +838,7 @@ class ADBController:
             在前台返回True，否则返回False
         """
         # 获取当前前台应用包名
-        cmd = "shell dumpsys activity activities | grep mResumedActivity"
-        output = self._run_cmd(cmd)
+        output = self._query_state(_ACTIVITY_STATE_CMD)
         
         if output and package_name in output:
             self.logger.debug(f"应用 {package_name} 正在前台运行")
@@ -348,8 +871,13 @@ class ADBController:
                 return self.start_activity(package_name, activity_name)
             else:
                 # 启动应用默认活动
-                cmd = f"shell am start -n {package_name}/.GameActivity || am start -n {package_name}/.MainActivity"
-                return self._run_cmd(cmd) is not None
+                component = self.resolve_launcher_activity(package_name)
+                if component:
+                    return self._shell_cmd(f"am start -n {component}") is not None
+                
+                # 无法解析时通过LAUNCHER intent启动
+                cmd = f"monkey -p {package_name} -c android.intent.category.LAUNCHER 1"
+                return self._shell_cmd(cmd) is not None
         except Exception as e:
             self.logger.error(f"切换应用到前台失败: {str(e)}")
             return False
@@ -366,17 +894,28 @@ class ADBController:
         """
         self.logger.info(f"尝试切换游戏 {package_name} 到前台")
         
+        # 一次调用同时获取屏幕状态和前台应用
+        screen_on, in_foreground = self.get_device_state(package_name)
+        if screen_on and in_foreground:
+            self.logger.info(f"应用 {package_name} 已经在前台运行")
+            return True
+        
         # 1. 检查设备是否解锁
-        if not self.is_screen_on():
+        if not screen_on:
             self.logger.info("屏幕已关闭，正在唤醒并解锁")
             self.wake_screen()
             time.sleep(0.5)
             self.unlock_screen()
             time.sleep(1.0)
+            self.invalidate_state()
         
         # 2. 检查并切换游戏到前台
         max_attempts = 3
         for attempt in range(max_attempts):
+            # 上一次尝试可能已改变前台应用，重新查询
+            if attempt > 0:
+                self.invalidate_state()
+            
             if self.bring_to_foreground(package_name, activity_name):
                 self.logger.info(f"游戏成功切换到前台（第 {attempt + 1} 次尝试）")
                 time.sleep(1.0)  # 等待游戏完全加载
@@ -394,10 +933,179 @@ class ADBController:
         Returns:
             屏幕开启返回True，否则返回False
         """
-        cmd = "shell dumpsys power | grep mWakefulness"
-        output = self._run_cmd(cmd)
+        output = self._query_state(_POWER_STATE_CMD)
         
         if output and "Awake" in output:
             return True
         
         return False
+
+
+class AsyncADBController:
+    """基于asyncio的ADB控制器
+    
+    每条命令启动独立的adb进程，多个命令（或多台设备）可在事件循环上并发执行，
+    适合同时编排多台设备的场景。
+    """
+    
+    def __init__(self, adb_path: str = "adb", device_id: str = "", logger=None):
+        """初始化异步ADB控制器
+        
+        Args:
+            adb_path: ADB工具路径
+            device_id: 设备ID，空字符串表示自动选择
+            logger: 日志对象
+        """
+        self.adb_path = adb_path
+        self.device_id = device_id
+        self.logger = logger
+        self._screen_size: Optional[Tuple[int, int]] = None
+    
+    @property
+    def _base_argv(self) -> List[str]:
+        """ADB命令前缀（包含设备ID）"""
+        if self.device_id:
+            return [self.adb_path, "-s", self.device_id]
+        return [self.adb_path]
+    
+    async def _run_cmd_async(self, argv: List[str], timeout: float = 5) -> Optional[str]:
+        """异步运行ADB命令
+        
+        Args:
+            argv: ADB参数列表
+            timeout: 超时时间（秒）
+            
+        Returns:
+            命令输出，失败返回None
+        """
+        full_cmd = " ".join(self._base_argv + argv)
+        self.logger.debug(f"运行ADB命令: {full_cmd}")
+        
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self._base_argv, *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except Exception as e:
+            self.logger.error(f"运行ADB命令时出错: {str(e)}")
+            return None
+        
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            self.logger.error(f"ADB命令超时: {full_cmd}")
+            return None
+        
+        if proc.returncode != 0:
+            self.logger.error(f"ADB命令失败: {full_cmd}")
+            self.logger.error(f"错误输出: {stderr.decode('utf-8', errors='replace').strip()}")
+            return None
+        
+        return stdout.decode('utf-8', errors='replace').strip()
+    
+    async def get_devices(self) -> List[str]:
+        """获取连接的设备列表
+        
+        Returns:
+            设备ID列表
+        """
+        return ADBController._parse_devices(await self._run_cmd_async(["devices"]))
+    
+    async def check_connection(self) -> bool:
+        """检查ADB连接是否正常，并缓存屏幕尺寸
+        
+        Returns:
+            连接正常返回True，否则返回False
+        """
+        self._screen_size = None
+        
+        if not self.device_id:
+            devices = await self.get_devices()
+            if not devices:
+                self.logger.error("未检测到连接的设备")
+                return False
+            
+            self.device_id = devices[0]
+            self.logger.info(f"自动选择设备: {self.device_id}")
+        
+        # 在线检查与屏幕尺寸查询并发执行
+        output, size_output = await asyncio.gather(
+            self._run_cmd_async(["shell", "echo", "test"]),
+            self._run_cmd_async(["shell", "wm", "size"])
+        )
+        if output != "test":
+            return False
+        
+        self._screen_size = ADBController._parse_screen_size(size_output)
+        return True
+    
+    async def get_screen_size(self) -> Optional[Tuple[int, int]]:
+        """获取屏幕尺寸（结果会被缓存）
+        
+        Returns:
+            (width, height) 元组，失败返回None
+        """
+        if self._screen_size is None:
+            output = await self._run_cmd_async(["shell", "wm", "size"])
+            self._screen_size = ADBController._parse_screen_size(output)
+        return self._screen_size
+    
+    async def is_screen_on(self) -> bool:
+        """检查屏幕是否开启
+        
+        Returns:
+            屏幕开启返回True，否则返回False
+        """
+        output = await self._run_cmd_async(["shell", _POWER_STATE_CMD])
+        return bool(output) and "Awake" in output
+    
+    async def is_package_in_foreground(self, package_name: str) -> bool:
+        """检查应用是否在前台运行
+        
+        Args:
+            package_name: 包名
+            
+        Returns:
+            在前台返回True，否则返回False
+        """
+        output = await self._run_cmd_async(["shell", _ACTIVITY_STATE_CMD])
+        return bool(output) and package_name in output
+    
+    async def tap(self, x: int, y: int, delay: float = 0) -> bool:
+        """点击屏幕
+        
+        Args:
+            x: X坐标
+            y: Y坐标
+            delay: 点击后延迟（秒）
+            
+        Returns:
+            成功返回True，失败返回False
+        """
+        result = await self._run_cmd_async(["shell", "input", "tap", str(x), str(y)], timeout=2)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return result is not None
+    
+    async def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 500, delay: float = 0) -> bool:
+        """滑动屏幕
+        
+        Args:
+            x1: 起始X坐标
+            y1: 起始Y坐标
+            x2: 结束X坐标
+            y2: 结束Y坐标
+            duration: 滑动持续时间（毫秒）
+            delay: 操作后延迟（秒）
+            
+        Returns:
+            成功返回True，失败返回False
+        """
+        argv = ["shell", "input", "swipe", str(x1), str(y1), str(x2), str(y2), str(duration)]
+        result = await self._run_cmd_async(argv, timeout=3 + duration / 1000)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return result is not None
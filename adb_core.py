@@ -7,26 +7,58 @@ ADB核心模块
 
 import os
 import subprocess
+import threading
 import time
 import random
 import re
-from typing import Optional, Tuple, List
+import shlex
+from typing import Optional, Tuple, List, Union
+
+import cv2
+import numpy as np
+
+from adb_utils import (backoff_delay, RawScreencapReader, ScreencapStream, ShellSession, Throttle,
+                       TokenBucket, RETRY_BASE_ERROR, RETRY_BASE_TIMEOUT)
+
+# `wm size` 输出解析，例如: Physical size: 1280x720
+_WM_SIZE_RE = re.compile(r'Physical size: (\d+)x(\d+)')
 
 class ADBCore:
     """ADB核心操作类"""
     
-    def __init__(self, adb_path: str = "adb", logger=None):
+    def __init__(self, adb_path: str = "adb", logger=None,
+                 default_jitter: Tuple[float, float] = (0.0, 0.0), fast_mode: bool = False,
+                 screenshot_interval: float = 0.5, frame_slots: int = 0):
         """初始化ADB核心
         
         Args:
             adb_path: ADB工具路径
             logger: 日志对象
+            default_jitter: 未指定delay时操作后的随机延迟范围（秒），(0, 0)表示不延迟
+            fast_mode: 快速模式，跳过所有操作后延迟
+            screenshot_interval: 两次截图之间的最小间隔（秒），0表示不限速
+            frame_slots: 原始截图复用的输出缓冲区数量，0表示每帧分配新数组；
+                启用时返回的图像会在之后第frame_slots次截图时被覆盖，
+                调用方同时持有的帧数不能超过该值
         """
         self.adb_path = adb_path
         self.logger = logger
+        self.default_jitter = default_jitter
+        self.fast_mode = fast_mode
         self.device_id = ""
         self.resolution = (1280, 720)  # 默认分辨率
-        self.last_screenshot_time = 0
+        self._shot_throttle = Throttle(screenshot_interval)
+        self.frame_slots = frame_slots
+        self._raw_reader = RawScreencapReader(frame_slots)
+        
+        # 常驻shell会话，首次执行shell命令时启动
+        self._shell = None
+        
+        # 常驻截图通道，首次截图时启动
+        self._capture_stream = None
+        
+        # 重试令牌桶，设备持续不可用时限制重试频率
+        self._retry_tokens = TokenBucket(capacity=10, refill_per_sec=1)
         
     def log(self, message: str, level: str = "INFO"):
         """日志记录
@@ -45,51 +77,129 @@ class ADBCore:
         else:
             print(f"[{time.strftime('%H:%M:%S')}] [{level}] {message}")
     
-    def _run_cmd(self, cmd: str, timeout: int = 10, retry: int = 1) -> Optional[str]:
+    @property
+    def _base_argv(self) -> List[str]:
+        """ADB命令前缀（含设备ID）"""
+        if self.device_id:
+            return [self.adb_path, "-s", self.device_id]
+        return [self.adb_path]
+    
+    def _run_cmd(self, cmd: Union[str, List[str]], timeout: int = 10, retry: int = 1) -> Optional[str]:
         """运行ADB命令
         
         Args:
-            cmd: 命令内容
+            cmd: 命令内容（字符串或参数列表）
             timeout: 超时时间（秒）
             retry: 重试次数
             
         Returns:
             命令输出，失败返回None
         """
-        full_cmd = f"{self.adb_path}"
-        
-        # 添加设备ID
-        if self.device_id:
-            full_cmd += f" -s {self.device_id}"
-        
-        full_cmd += f" {cmd}"
+        # 以参数列表运行，不经过系统shell解析
+        argv = self._base_argv + (shlex.split(cmd) if isinstance(cmd, str) else list(cmd))
+        full_cmd = " ".join(argv)
         
         for attempt in range(retry + 1):
             try:
                 self.log(f"ADB命令: {full_cmd}")
                 
                 result = subprocess.run(
-                    full_cmd, 
-                    shell=True, 
+                    argv, 
                     capture_output=True, 
-                    text=True, 
                     timeout=timeout
                 )
                 
                 if result.returncode == 0:
-                    return result.stdout.strip()
+                    self._retry_tokens.refund(1)
+                    return result.stdout.decode('utf-8', errors='replace').strip()
                 else:
-                    self.log(f"ADB命令失败: {result.stderr.strip()}")
-                    if attempt < retry:
-                        self.log(f"第 {attempt + 1} 次重试...")
-                        time.sleep(1)
+                    self.log(f"ADB命令失败: {result.stderr.decode('utf-8', errors='replace').strip()}")
+                    base = RETRY_BASE_ERROR
             except subprocess.TimeoutExpired:
                 self.log(f"ADB命令超时: {full_cmd}")
+                base = RETRY_BASE_TIMEOUT
             except Exception as e:
                 self.log(f"ADB命令执行错误: {str(e)}")
+                base = RETRY_BASE_ERROR
+            
+            if not self._wait_retry(attempt, retry, base):
+                break
         
         return None
     
+    def _wait_retry(self, attempt: int, retry: int, base: float) -> bool:
+        """失败后按指数退避等待重试
+        
+        Args:
+            attempt: 当前尝试序号（从0开始）
+            retry: 重试次数
+            base: 基础退避时间（秒）
+            
+        Returns:
+            需要继续重试返回True，否则返回False
+        """
+        if attempt >= retry:
+            return False
+        
+        if not self._retry_tokens.take(1):
+            self.log("重试令牌已耗尽，放弃重试")
+            return False
+        
+        delay = backoff_delay(attempt, base)
+        self.log(f"第 {attempt + 1} 次重试（{delay:.2f}秒后）...")
+        time.sleep(delay)
+        return True
+    
+    def _shell_cmd(self, cmd: str, timeout: int = 10, retry: int = 1) -> Optional[str]:
+        """在常驻shell会话中运行设备端命令
+        
+        Args:
+            cmd: 设备端shell命令
+            timeout: 超时时间（秒）
+            retry: 重试次数
+            
+        Returns:
+            命令输出，失败返回None
+        """
+        # 首次调用时创建会话；设备切换后旧设备的会话和截图通道一并关闭再重建
+        if self._shell is None or self._shell.device_id != self.device_id:
+            if self._shell is not None:
+                self.close()
+            self._shell = ShellSession(self.adb_path, self.device_id)
+        
+        for attempt in range(retry + 1):
+            try:
+                self.log(f"shell命令: {cmd}")
+                
+                returncode, output = self._shell.run(cmd, timeout=timeout)
+                
+                if returncode == 0:
+                    self._retry_tokens.refund(1)
+                    return output.strip()
+                else:
+                    self.log(f"shell命令失败: {output.strip()}")
+                    base = RETRY_BASE_ERROR
+            except subprocess.TimeoutExpired:
+                self.log(f"shell命令超时: {cmd}")
+                base = RETRY_BASE_TIMEOUT
+            except Exception as e:
+                self.log(f"shell命令执行错误: {str(e)}")
+                base = RETRY_BASE_ERROR
+            
+            if not self._wait_retry(attempt, retry, base):
+                break
+        
+        return None
+    
+    def close(self):
+        """关闭常驻shell会话和截图通道"""
+        if self._shell is not None:
+            self._shell.close()
+            self._shell = None
+        if self._capture_stream is not None:
+            self._capture_stream.close()
+            self._capture_stream = None
+    
     def check_connection(self) -> bool:
         """检查ADB连接
         
@@ -141,13 +251,13 @@ class ADBCore:
         Returns:
             分辨率符合要求返回True，否则返回False
         """
-        output = self._run_cmd("shell wm size")
+        output = self._shell_cmd("wm size")
         if output is None:
             self.log("无法获取设备分辨率")
             return False
         
         # 解析分辨率
-        match = re.search(r'Physical size: (\d+)x(\d+)', output)
+        match = _WM_SIZE_RE.search(output)
         if match:
             width = int(match.group(1))
             height = int(match.group(2))
@@ -161,6 +271,114 @@ class ADBCore:
         
         return False
     
+    def screenshot_bytes(self, png: bool = False) -> Optional[bytes]:
+        """以原始格式截取屏幕
+        
+        通过 `exec-out screencap` 直接读取像素数据，不经过设备存储
+        
+        Args:
+            png: 是否输出PNG编码数据
+        
+        Returns:
+            screencap原始输出，失败返回None
+        """
+        argv = self._base_argv + ["exec-out", "screencap"]
+        if png:
+            argv.append("-p")
+        
+        try:
+            proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                data, err = proc.communicate(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                self.log("截图超时")
+                return None
+        except Exception as e:
+            self.log(f"截图命令执行错误: {str(e)}")
+            return None
+        
+        if proc.returncode != 0 or not data:
+            self.log(f"截图失败: {err.decode(errors='replace').strip()}")
+            return None
+        
+        return data
+    
+    def _read_stream_frame(self) -> Optional[np.ndarray]:
+        """通过常驻截图通道读取一帧
+        
+        Returns:
+            BGR图像数组，失败返回None
+        """
+        if self._capture_stream is None or self._capture_stream.device_id != self.device_id:
+            if self._capture_stream is not None:
+                self._capture_stream.close()
+            self._capture_stream = ScreencapStream(self.adb_path, self.device_id, self.frame_slots)
+        
+        try:
+            return self._capture_stream.capture()
+        except Exception as e:
+            self.log(f"常驻截图通道失败: {str(e)}")
+            return None
+    
+    def _read_raw_frame(self, timeout: int = 10) -> Optional[np.ndarray]:
+        """从 `exec-out screencap` 管道直接读取一帧到复用缓冲区
+        
+        Args:
+            timeout: 超时时间（秒）
+            
+        Returns:
+            BGR图像数组，失败返回None
+        """
+        argv = self._base_argv + ["exec-out", "screencap"]
+        
+        try:
+            proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except Exception as e:
+            self.log(f"截图命令执行错误: {str(e)}")
+            return None
+        
+        # 读取阻塞时由定时器结束进程
+        killer = threading.Timer(timeout, proc.kill)
+        killer.start()
+        try:
+            return self._raw_reader.read(proc.stdout)
+        finally:
+            killer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+    
+    def screenshot_array(self) -> Optional[np.ndarray]:
+        """截取屏幕并直接返回图像数组
+        
+        Returns:
+            BGR图像数组，失败返回None
+        """
+        # 检查截图频率
+        self._shot_throttle.wait()
+        
+        # 优先使用常驻截图通道，失败时退回一次性截图
+        image = self._read_stream_frame()
+        if image is not None:
+            return image
+        
+        image = self._read_raw_frame()
+        if image is not None:
+            return image
+        
+        # 原始格式无法解析时退回PNG格式
+        data = self.screenshot_bytes(png=True)
+        if data is None:
+            return None
+        
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            self.log("无法解析截图数据")
+        return image
+    
     def screenshot(self, save_path: str = "screenshot.png") -> Optional[str]:
         """截取屏幕
         
@@ -171,54 +389,86 @@ class ADBCore:
             截图路径，失败返回None
         """
         # 检查截图频率
-        current_time = time.time()
-        if current_time - self.last_screenshot_time < 0.5:
-            time.sleep(0.5 - (current_time - self.last_screenshot_time))
+        self._shot_throttle.wait()
         
-        temp_path = "/sdcard/screenshot.png"
+        # 设备端PNG输出直接写入本地文件，本地无需解码再编码
+        argv = self._base_argv + ["exec-out", "screencap", "-p"]
+        try:
+            with open(save_path, 'wb') as f:
+                result = subprocess.run(argv, stdout=f, stderr=subprocess.PIPE, timeout=10)
+        except subprocess.TimeoutExpired:
+            self.log("截图超时")
+            return None
+        except Exception as e:
+            self.log(f"截图命令执行错误: {str(e)}")
+            return None
         
-        # 截图命令
-        if self._run_cmd(f"shell screencap -p {temp_path}"):
-            # 拉取截图
-            if self._run_cmd(f"pull {temp_path} {save_path}"):
-                # 删除临时文件
-                self._run_cmd(f"shell rm {temp_path}", timeout=2)
-                self.last_screenshot_time = time.time()
-                return save_path
+        if result.returncode != 0 or os.path.getsize(save_path) == 0:
+            self.log(f"保存截图失败: {result.stderr.decode(errors='replace').strip()}")
+            return None
         
-        return None
+        return save_path
+    
+    def _post_action_delay(self, delay: Optional[float]):
+        """操作后延迟
+        
+        Args:
+            delay: 延迟时间（秒），None表示使用default_jitter范围内的随机延迟
+        """
+        if self.fast_mode:
+            return
+        
+        if delay is None:
+            low, high = self.default_jitter
+            if high <= 0:
+                return
+            delay = random.uniform(low, high)
+            self.log(f"随机延迟: {delay:.2f}秒")
+        
+        if delay > 0:
+            time.sleep(delay)
     
-    def tap(self, x: int, y: int, delay: float = 0.0):
+    def tap(self, x: int, y: int, delay: Optional[float] = None):
         """点击屏幕
         
         Args:
             x: X坐标
             y: Y坐标
-            delay: 点击后延迟时间
+            delay: 点击后延迟时间，None表示使用默认随机延迟
         """
-        cmd = f"shell input tap {x} {y}"
-        self._run_cmd(cmd)
+        cmd = f"input tap {x} {y}"
+        self._shell_cmd(cmd)
+        self._post_action_delay(delay)
+    
+    def tap_batch(self, points: List[Tuple[int, int, float]]) -> bool:
+        """一次shell调用连续点击多个位置
         
-        # 添加随机延迟
-        if delay > 0:
-            time.sleep(delay)
-        else:
-            # 随机延迟0.5-1.5秒
-            random_delay = random.uniform(0.5, 1.5)
-            self.log(f"随机延迟: {random_delay:.2f}秒")
-            time.sleep(random_delay)
+        Args:
+            points: (x, y, 点击后等待秒数) 列表，等待在设备端执行
+            
+        Returns:
+            成功返回True，失败返回False
+        """
+        if not points:
+            return True
+        
+        cmd = "; ".join(f"input tap {x} {y}; sleep {wait}" if wait > 0 else f"input tap {x} {y}"
+                        for x, y, wait in points)
+        timeout = 10 + sum(wait for _, _, wait in points)
+        return self._shell_cmd(cmd, timeout=timeout) is not None
     
-    def keyevent(self, keycode: int):
+    def keyevent(self, keycode: int, delay: Optional[float] = None):
         """发送按键事件
         
         Args:
             keycode: 按键代码
+            delay: 按键后延迟时间，None表示使用默认随机延迟
         """
-        cmd = f"shell input keyevent {keycode}"
-        self._run_cmd(cmd)
-        time.sleep(random.uniform(0.5, 1.5))
+        cmd = f"input keyevent {keycode}"
+        self._shell_cmd(cmd)
+        self._post_action_delay(delay)
     
-    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 500):
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int = 500, delay: Optional[float] = None):
         """滑动屏幕
         
         Args:
@@ -227,10 +477,11 @@ class ADBCore:
             x2: 结束X坐标
             y2: 结束Y坐标
             duration: 滑动持续时间（毫秒）
+            delay: 滑动后延迟时间，None表示使用默认随机延迟
         """
-        cmd = f"shell input swipe {x1} {y1} {x2} {y2} {duration}"
-        self._run_cmd(cmd)
-        time.sleep(random.uniform(0.5, 1.5))
+        cmd = f"input swipe {x1} {y1} {x2} {y2} {duration}"
+        self._shell_cmd(cmd)
+        self._post_action_delay(delay)
     
     def get_resolution(self) -> Tuple[int, int]:
         """获取设备分辨率
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ADB公共工具模块
+供ADBCore与ADBController共用的辅助函数
+"""
+
+import queue
+import random
+import struct
+import subprocess
+import threading
+import time
+import uuid
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# screencap原始输出支持的像素格式（均为每像素4字节，RGBA顺序）
+RAW_PIXEL_FORMATS = (1, 2)  # PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888
+
+# 重试退避参数（秒）
+RETRY_BASE_TIMEOUT = 0.5  # 超时多为设备端问题（断连、卡顿），退避起点更高
+RETRY_BASE_ERROR = 0.2    # 非零返回码多为命令本身失败，可更快重试
+RETRY_CAP = 3.0
+
+
+def backoff_delay(attempt: int, base: float, cap: float = RETRY_CAP) -> float:
+    """计算带随机抖动的指数退避时间
+    
+    Args:
+        attempt: 已失败次数（从0开始）
+        base: 基础延迟（秒）
+        cap: 延迟上限（秒）
+        
+    Returns:
+        本次重试前应等待的时间（秒）
+    """
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+class TokenBucket:
+    """重试令牌桶
+    
+    每次重试消耗一个令牌，命令成功时归还，令牌按固定速率恢复。
+    设备长时间不可用时令牌耗尽，停止重试以免反复冲击adb。
+    """
+    
+    def __init__(self, capacity: float = 10, refill_per_sec: float = 1):
+        """初始化令牌桶
+        
+        Args:
+            capacity: 令牌容量
+            refill_per_sec: 每秒恢复的令牌数
+        """
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        """按流逝时间恢复令牌（调用方需持有锁）"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.refill_per_sec)
+        self._last = now
+    
+    def take(self, n: float = 1) -> bool:
+        """尝试取出令牌
+        
+        Args:
+            n: 令牌数
+            
+        Returns:
+            令牌足够返回True，否则返回False
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < n:
+                return False
+            self._tokens -= n
+            return True
+    
+    def refund(self, n: float = 1):
+        """归还令牌
+        
+        Args:
+            n: 令牌数
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + n)
+
+
+def decode_raw_screencap(data: bytes) -> Optional[np.ndarray]:
+    """解析 `screencap` 原始输出为BGR图像
+
+    原始输出由头部（width, height, format，Android 9+ 额外带 colorspace）
+    和像素数据组成，头部长度由像素数据长度反推，兼容12字节和16字节两种头部。
+
+    Args:
+        data: `adb exec-out screencap` 的原始输出
+
+    Returns:
+        BGR图像数组，解析失败返回None
+    """
+    if not data or len(data) < 12:
+        return None
+
+    width, height, pixel_format = struct.unpack_from('<III', data, 0)
+    if pixel_format not in RAW_PIXEL_FORMATS:
+        return None
+
+    pixel_size = width * height * 4
+    header_size = len(data) - pixel_size
+    if header_size not in (12, 16):
+        return None
+
+    rgba = np.frombuffer(data, dtype=np.uint8, count=pixel_size, offset=header_size)
+    return cv2.cvtColor(rgba.reshape(height, width, 4), cv2.COLOR_RGBA2BGR)
+
+
+class RawScreencapReader:
+    """复用预分配缓冲区读取 `screencap` 原始输出
+    
+    像素数据通过readinto直接写入同一块缓冲区，避免每帧重新分配内存。
+    指定out_slots时颜色转换结果也轮流写入预分配的输出缓冲区，
+    返回的数组会在之后第out_slots次读取时被覆盖。
+    """
+    
+    def __init__(self, out_slots: int = 0):
+        """初始化读取器（缓冲区在首次读取时按屏幕尺寸分配）
+        
+        Args:
+            out_slots: 轮换使用的输出缓冲区数量，0表示每帧分配新数组
+        """
+        self._buf = None
+        self._out = [None] * out_slots
+        self._out_idx = 0
+    
+    def read(self, stream, header_size: Optional[int] = None, grayscale: bool = False) -> Optional[np.ndarray]:
+        """从screencap输出流读取一帧
+        
+        Args:
+            stream: `adb exec-out screencap` 的stdout
+            header_size: 头部长度（12或16），None表示读到流结束后按长度推断
+            grayscale: 是否直接转为灰度图（省去BGR中间结果）
+            
+        Returns:
+            BGR（或灰度）图像数组，解析失败返回None
+        """
+        header = stream.read(12)
+        if len(header) < 12:
+            return None
+        
+        width, height, pixel_format = struct.unpack('<III', header)
+        if pixel_format not in RAW_PIXEL_FORMATS:
+            return None
+        
+        # 多预留4字节容纳可能存在的colorspace字段，按实际读取长度判断头部长度
+        pixel_size = width * height * 4
+        capacity = pixel_size + 4
+        if self._buf is None or self._buf.size != capacity:
+            self._buf = np.empty(capacity, dtype=np.uint8)
+        
+        # 常驻流中的帧之后没有EOF，头部长度只能由调用方给出
+        if header_size is not None:
+            if header_size > 12 and len(stream.read(header_size - 12)) < header_size - 12:
+                return None
+            expected = pixel_size
+        else:
+            expected = capacity
+        
+        view = memoryview(self._buf)
+        total = 0
+        while total < expected:
+            n = stream.readinto(view[total:expected])
+            if not n:
+                break
+            total += n
+        
+        if total == capacity:
+            offset = 4
+        elif total == pixel_size:
+            offset = 0
+        else:
+            return None
+        
+        rgba = self._buf[offset:offset + pixel_size].reshape(height, width, 4)
+        code = cv2.COLOR_RGBA2GRAY if grayscale else cv2.COLOR_RGBA2BGR
+        if not self._out:
+            return cv2.cvtColor(rgba, code)
+        
+        shape = (height, width) if grayscale else (height, width, 3)
+        out = self._out[self._out_idx]
+        if out is None or out.shape != shape:
+            out = np.empty(shape, dtype=np.uint8)
+            self._out[self._out_idx] = out
+        self._out_idx = (self._out_idx + 1) % len(self._out)
+        return cv2.cvtColor(rgba, code, dst=out)
+
+
+class ScreencapStream:
+    """常驻截图通道
+    
+    保持一个 `adb exec-out sh` 进程，每次截图只向其stdin写入 `screencap`，
+    从stdout读取已知长度的原始帧，省去每帧启动adb进程和建立传输的开销。
+    """
+    
+    def __init__(self, adb_path: str = "adb", device_id: str = "", out_slots: int = 0):
+        """初始化截图通道（首次截图时才启动进程）
+        
+        Args:
+            adb_path: ADB工具路径
+            device_id: 设备ID
+            out_slots: 轮换使用的输出缓冲区数量，见RawScreencapReader
+        """
+        self.adb_path = adb_path
+        self.device_id = device_id
+        self._proc = None
+        self._header_size = 12
+        self._reader = RawScreencapReader(out_slots)
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """启动 `adb exec-out sh` 进程并确定screencap头部长度"""
+        argv = [self.adb_path]
+        if self.device_id:
+            argv += ["-s", self.device_id]
+        argv += ["exec-out", "sh"]
+        
+        self._proc = subprocess.Popen(
+            argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        
+        # Android 9 (SDK 28) 起头部多一个colorspace字段
+        self._proc.stdin.write(b"getprop ro.build.version.sdk\n")
+        self._proc.stdin.flush()
+        sdk = self._proc.stdout.readline().strip()
+        self._header_size = 16 if sdk.isdigit() and int(sdk) >= 28 else 12
+    
+    def is_alive(self) -> bool:
+        """检查截图进程是否存活"""
+        return self._proc is not None and self._proc.poll() is None
+    
+    def capture(self, timeout: float = 5, grayscale: bool = False) -> Optional[np.ndarray]:
+        """截取一帧
+        
+        Args:
+            timeout: 超时时间（秒），超时后关闭通道
+            grayscale: 是否直接输出灰度图
+            
+        Returns:
+            BGR图像数组，失败返回None（此时通道已关闭，下次调用会重建）
+        """
+        with self._lock:
+            if not self.is_alive():
+                self.start()
+            
+            # 读取阻塞时由定时器结束进程
+            killer = threading.Timer(timeout, self._proc.kill)
+            killer.start()
+            try:
+                self._proc.stdin.write(b"screencap\n")
+                self._proc.stdin.flush()
+                image = self._reader.read(self._proc.stdout, self._header_size, grayscale)
+            except OSError:
+                image = None
+            finally:
+                killer.cancel()
+            
+            # 帧不完整时流已错位，无法继续使用
+            if image is None:
+                self._close_locked()
+            return image
+    
+    def _close_locked(self):
+        """关闭进程（调用方需持有锁）"""
+        if self._proc is None:
+            return
+        
+        try:
+            if self._proc.poll() is None:
+                self._proc.stdin.close()
+                self._proc.kill()
+            self._proc.wait(timeout=1)
+        except Exception:
+            pass
+        finally:
+            self._proc = None
+    
+    def close(self):
+        """关闭截图通道"""
+        with self._lock:
+            self._close_locked()
+
+
+class Throttle:
+    """最小间隔限速器（基于单调时钟，不受系统时间调整影响）"""
+    
+    def __init__(self, min_interval: float):
+        """初始化限速器
+        
+        Args:
+            min_interval: 两次调用之间的最小间隔（秒），0表示不限速
+        """
+        self.min_interval = min_interval
+        self._next = 0.0
+    
+    def wait(self):
+        """等待到允许下一次调用的时刻"""
+        now = time.monotonic()
+        sleep_time = self._next - now
+        if sleep_time > 0:
+            time.sleep(sleep_time)
+        self._next = max(now, self._next) + self.min_interval
+
+
+class ShellSession:
+    """常驻 `adb shell` 会话
+    
+    命令经stdin逐条下发，每条命令后输出带返回码的结束标记，
+    避免每次命令都重新启动adb进程并建立新的shell传输。
+    """
+    
+    def __init__(self, adb_path: str = "adb", device_id: str = ""):
+        """初始化shell会话（首次执行命令时才启动进程）
+        
+        Args:
+            adb_path: ADB工具路径
+            device_id: 设备ID
+        """
+        self.adb_path = adb_path
+        self.device_id = device_id
+        self._proc = None
+        self._lines = None
+        self._marker = f"__END_{uuid.uuid4().hex}__"
+        # 同一会话中的命令必须串行执行，防止多线程输出交错
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """启动 `adb shell` 进程及输出读取线程"""
+        argv = [self.adb_path]
+        if self.device_id:
+            argv += ["-s", self.device_id]
+        argv.append("shell")
+        
+        self._proc = subprocess.Popen(
+            argv,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=0
+        )
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._read_loop, args=(self._proc, self._lines), daemon=True)
+        reader.start()
+    
+    @staticmethod
+    def _read_loop(proc: subprocess.Popen, lines: queue.Queue):
+        """持续读取shell输出，进程结束时放入None"""
+        for line in iter(proc.stdout.readline, b''):
+            lines.put(line)
+        lines.put(None)
+    
+    def is_alive(self) -> bool:
+        """检查shell进程是否存活"""
+        return self._proc is not None and self._proc.poll() is None
+    
+    def run(self, cmd: str, timeout: float = 5) -> Tuple[int, str]:
+        """在会话中执行一条命令
+        
+        Args:
+            cmd: 设备端shell命令
+            timeout: 超时时间（秒）
+            
+        Returns:
+            (返回码, 输出)
+            
+        Raises:
+            subprocess.TimeoutExpired: 等待结束标记超时
+            ConnectionError: shell进程已退出
+        """
+        with self._lock:
+            return self._run_locked(cmd, timeout)
+    
+    def _run_locked(self, cmd: str, timeout: float) -> Tuple[int, str]:
+        """执行命令（调用方需持有锁）"""
+        if not self.is_alive():
+            self.start()
+        
+        # 命令的stdin重定向到/dev/null，防止其读走后续命令
+        payload = f"( {cmd} ) </dev/null; __rc=$?; echo; echo {self._marker}$__rc\n"
+        self._proc.stdin.write(payload.encode())
+        self._proc.stdin.flush()
+        
+        marker = self._marker.encode()
+        output = []
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                line = self._lines.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                # 残留输出会污染后续命令，直接重建会话
+                self.close()
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            
+            if line is None:
+                self.close()
+                raise ConnectionError("adb shell 会话已断开")
+            
+            # 逐行只做字节比较，输出在结束时统一解码一次
+            if line.startswith(marker):
+                returncode = int(line[len(marker):].strip() or -1)
+                return returncode, b''.join(output).decode('utf-8', errors='replace')
+            output.append(line)
+    
+    def close(self):
+        """关闭shell会话"""
+        if self._proc is None:
+            return
+        
+        try:
+            if self._proc.poll() is None:
+                self._proc.stdin.write(b"exit\n")
+                self._proc.stdin.close()
+                self._proc.wait(timeout=1)
+        except Exception:
+            self._proc.kill()
+        finally:
+            self._proc = None
+            self._lines = None
@@ -6,11 +6,18 @@
 """
 
 import time
-import cv2
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
 from scene_recognition import SceneType
 
+# 预生成的随机抖动系数数量
+DELAY_BUFFER_SIZE = 1024
+
+# 帧哈希汉明距离不超过该值时视为同一画面，直接复用上次的场景识别结果
+FRAME_HASH_THRESHOLD = 3
+
 class AutoFlow:
     """自动化流程类"""
     
@@ -23,7 +30,7 @@ class AutoFlow:
             ocr: OCR识别器对象
             image_processor: 图像处理对象
             logger: 日志对象
-            config: 配置对象
+            config: 配置对象；可选字段grayscale表示是否直接截取灰度图，未定义时为False
         """
         self.adb = adb
         self.scene_recognizer = scene_recognizer
@@ -40,7 +47,31 @@ class AutoFlow:
         
         # 操作计数，用于控制操作频率
         self.operation_count = 0
-        self.last_operation_time = time.time()
+        self.last_operation_time = time.monotonic()
+        
+        # 截图预取线程，下一帧的截图与当前帧的识别并行
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=1)
+        
+        # 上一帧的哈希及场景识别结果，每次等待战斗结束时重置
+        self._last_frame_hash = None
+        self._last_scene = None
+        
+        # 实例独立的随机数生成器，操作延迟的抖动系数批量生成后逐个取用
+        self._rng = np.random.default_rng()
+        self._delay_buf = self._rng.uniform(-1.0, 1.0, DELAY_BUFFER_SIZE)
+        self._delay_idx = 0
+        
+        # 场景处理函数映射
+        self._handlers = {
+            SceneType.MAIN_MENU: self._handle_main_menu,
+            SceneType.MONEY_WAR_MENU: self._handle_money_war_menu,
+            SceneType.BATTLE_PREPARE: self._handle_battle_prepare,
+            SceneType.BATTLE_IN_PROGRESS: self._handle_battle_in_progress,
+            SceneType.BATTLE_RESULT: self._handle_battle_result,
+            SceneType.REWARD_COLLECTION: self._handle_reward_collection,
+            SceneType.SCORE_DISPLAY: self._handle_score_display,
+            SceneType.UNKNOWN: self._handle_unknown_scene
+        }
         
     def execute_round(self) -> bool:
         """执行一轮完整的货币战争流程
@@ -52,15 +83,10 @@ class AutoFlow:
             self.logger.info("开始执行一轮货币战争流程")
             
             # 1. 获取当前屏幕截图
-            screenshot_path = self.adb.screenshot()
-            if not screenshot_path:
-                self.logger.error("无法获取屏幕截图")
-                return False
-            
-            # 加载图像
-            image = cv2.imread(screenshot_path)
+            # 配置为灰度处理时直接获取灰度图，后续识别无需再转换
+            image = self.adb.screenshot_array(grayscale=getattr(self.config, 'grayscale', False))
             if image is None:
-                self.logger.error("无法加载截图")
+                self.logger.error("无法获取屏幕截图")
                 return False
             
             # 2. 识别当前场景
@@ -68,11 +94,12 @@ class AutoFlow:
             self.current_scene = scene_type
             
             # 更新积分信息
-            if 'score' in scene_info:
-                self.current_score = scene_info['score']
-                self.logger.info(f"当前积分: {self.current_score}")
+            score = scene_info.get('score')
+            if score is not None:
+                self.current_score = score
+                self.logger.info("当前积分: %s", self.current_score)
             
-            self.logger.info(f"当前场景: {scene_type.name}")
+            self.logger.info("当前场景: %s", scene_type.name)
             
             # 3. 根据场景执行相应操作
             success = self._handle_scene(scene_type, image, scene_info)
@@ -85,7 +112,7 @@ class AutoFlow:
             return success
             
         except Exception as e:
-            self.logger.error(f"执行流程失败: {str(e)}", exc_info=True)
+            self.logger.error("执行流程失败: %s", e, exc_info=True)
             return False
     
     def _handle_scene(self, scene_type: SceneType, image: np.ndarray, scene_info: dict) -> bool:
@@ -99,18 +126,7 @@ class AutoFlow:
         Returns:
             处理成功返回True，失败返回False
         """
-        handlers = {
-            SceneType.MAIN_MENU: self._handle_main_menu,
-            SceneType.MONEY_WAR_MENU: self._handle_money_war_menu,
-            SceneType.BATTLE_PREPARE: self._handle_battle_prepare,
-            SceneType.BATTLE_IN_PROGRESS: self._handle_battle_in_progress,
-            SceneType.BATTLE_RESULT: self._handle_battle_result,
-            SceneType.REWARD_COLLECTION: self._handle_reward_collection,
-            SceneType.SCORE_DISPLAY: self._handle_score_display,
-            SceneType.UNKNOWN: self._handle_unknown_scene
-        }
-        
-        handler = handlers.get(scene_type, self._handle_unknown_scene)
+        handler = self._handlers.get(scene_type, self._handle_unknown_scene)
         return handler(image, scene_info)
     
     def _handle_main_menu(self, image: np.ndarray, scene_info: dict) -> bool:
@@ -129,7 +145,7 @@ class AutoFlow:
         war_button = self.scene_recognizer.detect_button(image, "货币战争")
         if war_button:
             x, y = war_button
-            self.logger.info(f"点击货币战争入口: ({x}, {y})")
+            self.logger.info("点击货币战争入口: (%d, %d)", x, y)
             self.adb.tap(x, y, delay=self.config.operation_delay)
             time.sleep(self.config.long_operation_delay)
             return True
@@ -158,7 +174,7 @@ class AutoFlow:
         
         if start_button:
             x, y = start_button
-            self.logger.info(f"点击开始挑战: ({x}, {y})")
+            self.logger.info("点击开始挑战: (%d, %d)", x, y)
             self.adb.tap(x, y, delay=self.config.operation_delay)
             time.sleep(self.config.long_operation_delay)
             return True
@@ -187,7 +203,7 @@ class AutoFlow:
         
         if start_button:
             x, y = start_button
-            self.logger.info(f"点击开始战斗: ({x}, {y})")
+            self.logger.info("点击开始战斗: (%d, %d)", x, y)
             self.adb.tap(x, y, delay=self.config.operation_delay)
             time.sleep(self.config.long_operation_delay)
             self.total_battles += 1
@@ -214,21 +230,19 @@ class AutoFlow:
         # 获取交互点
         interaction_points = self.scene_recognizer.find_interaction_points(SceneType.BATTLE_IN_PROGRESS, image)
         
-        # 1. 点击技能1
-        if 'skill_1' in interaction_points:
-            x, y = interaction_points['skill_1']
-            self.logger.info(f"使用技能1: ({x}, {y})")
-            self.adb.tap(x, y, delay=self.config.operation_delay)
-            time.sleep(1.0)
+        # 1. 依次点击技能1、技能2，合并为一次shell调用，点击间隔在设备端等待
+        tap_wait = self.config.operation_delay + 1.0
+        taps = []
+        for index, skill in enumerate(('skill_1', 'skill_2'), 1):
+            if skill in interaction_points:
+                x, y = interaction_points[skill]
+                self.logger.info("使用技能%d: (%d, %d)", index, x, y)
+                taps.append((x, y, tap_wait))
         
-        # 2. 点击技能2
-        if 'skill_2' in interaction_points:
-            x, y = interaction_points['skill_2']
-            self.logger.info(f"使用技能2: ({x}, {y})")
-            self.adb.tap(x, y, delay=self.config.operation_delay)
-            time.sleep(1.0)
+        if taps:
+            self.adb.tap_batch(taps)
         
-        # 3. 等待战斗结束
+        # 2. 等待战斗结束
         self.logger.info("等待战斗结束...")
         battle_complete = self._wait_for_battle_complete()
         
@@ -247,9 +261,9 @@ class AutoFlow:
         self.logger.info("处理战斗结果场景")
         
         # 更新战斗统计
-        if 'result' in scene_info:
-            result = scene_info['result']
-            self.logger.info(f"战斗结果: {result}")
+        result = scene_info.get('result')
+        if result is not None:
+            self.logger.info("战斗结果: %s", result)
             if result == '胜利':
                 self.win_count += 1
         
@@ -262,7 +276,7 @@ class AutoFlow:
         
         if confirm_button:
             x, y = confirm_button
-            self.logger.info(f"点击确定: ({x}, {y})")
+            self.logger.info("点击确定: (%d, %d)", x, y)
             self.adb.tap(x, y, delay=self.config.operation_delay)
             time.sleep(self.config.long_operation_delay)
             return True
@@ -283,9 +297,10 @@ class AutoFlow:
         self.logger.info("处理奖励领取场景")
         
         # 显示奖励信息
-        if 'reward' in scene_info and scene_info['reward']:
-            reward_str = ", ".join([f"{k}: {v}" for k, v in scene_info['reward'].items()])
-            self.logger.info(f"获得奖励: {reward_str}")
+        reward = scene_info.get('reward')
+        if reward:
+            reward_str = ", ".join([f"{k}: {v}" for k, v in reward.items()])
+            self.logger.info("获得奖励: %s", reward_str)
         
         # 查找领取奖励按钮
         collect_button = self.scene_recognizer.detect_button(image, "领取奖励")
@@ -296,7 +311,7 @@ class AutoFlow:
         
         if collect_button:
             x, y = collect_button
-            self.logger.info(f"点击领取奖励: ({x}, {y})")
+            self.logger.info("点击领取奖励: (%d, %d)", x, y)
             self.adb.tap(x, y, delay=self.config.operation_delay)
             time.sleep(self.config.long_operation_delay)
             return True
@@ -315,22 +330,23 @@ class AutoFlow:
             处理成功返回True，失败返回False
         """
         self.logger.info("处理积分显示场景")
+        operation_delay = self.config.operation_delay
         
         # 查找返回按钮
         back_button = self.scene_recognizer.detect_button(image, "返回")
         if back_button:
             x, y = back_button
-            self.logger.info(f"点击返回: ({x}, {y})")
-            self.adb.tap(x, y, delay=self.config.operation_delay)
-            time.sleep(self.config.operation_delay)
+            self.logger.info("点击返回: (%d, %d)", x, y)
+            self.adb.tap(x, y, delay=operation_delay)
+            time.sleep(operation_delay)
             return True
         
         # 如果没有返回按钮，尝试点击屏幕中心
         height, width = image.shape[:2]
         center_x, center_y = width // 2, height // 2
-        self.logger.info(f"点击屏幕中心返回: ({center_x}, {center_y})")
-        self.adb.tap(center_x, center_y, delay=self.config.operation_delay)
-        time.sleep(self.config.operation_delay)
+        self.logger.info("点击屏幕中心返回: (%d, %d)", center_x, center_y)
+        self.adb.tap(center_x, center_y, delay=operation_delay)
+        time.sleep(operation_delay)
         
         return True
     
@@ -356,46 +372,87 @@ class AutoFlow:
         self.adb.tap(center_x, center_y, delay=self.config.operation_delay)
         time.sleep(self.config.long_operation_delay)
         
-        # 再次尝试识别场景
-        new_scene, new_info = self.scene_recognizer.recognize_scene(image)
-        if new_scene != SceneType.UNKNOWN:
-            self.logger.info(f"成功切换到已知场景: {new_scene.name}")
-            return True
-        
-        self.logger.error("无法处理未知场景")
-        return False
+        # 点击后的场景由下一轮重新截图识别
+        return True
     
-    def _wait_for_battle_complete(self, timeout: int = 60) -> bool:
+    def _wait_for_battle_complete(self, timeout: int = 60, poll_interval: float = 0.5) -> bool:
         """等待战斗结束
         
+        下一帧截图在后台线程中预取，与当前帧的场景识别重叠执行
+        
         Args:
             timeout: 超时时间（秒）
+            poll_interval: 两次检查之间的间隔（秒）
             
         Returns:
             战斗结束返回True，超时返回False
         """
-        start_time = time.time()
-        
-        while time.time() - start_time < timeout:
-            # 获取当前屏幕
-            screenshot_path = self.adb.screenshot()
-            if screenshot_path:
-                image = cv2.imread(screenshot_path)
-                if image:
-                    # 识别场景
-                    scene_type, scene_info = self.scene_recognizer.recognize_scene(image)
+        # 循环内反复调用的方法提前取出
+        screenshot_array = self.adb.screenshot_array
+        grayscale = getattr(self.config, 'grayscale', False)
+        recognize_scene = self.scene_recognizer.recognize_scene
+        is_battle_complete = self.scene_recognizer.is_battle_complete
+        
+        # 识别缓存只在本次等待内有效，不与上一轮的最后一帧比较
+        self._last_frame_hash = None
+        self._last_scene = None
+        
+        # 返回时通知仍在等待的预取任务放弃截图
+        stop = threading.Event()
+        
+        def capture_after(delay: float) -> Optional[np.ndarray]:
+            if stop.wait(delay):
+                return None
+            return screenshot_array(grayscale=grayscale)
+        
+        start_time = time.monotonic()
+        pending = self._prefetch_pool.submit(capture_after, 0)
+        
+        try:
+            while time.monotonic() - start_time < timeout:
+                # 获取当前屏幕，同时预取间隔之后的下一帧，截图与识别并行进行
+                image = pending.result()
+                pending = self._prefetch_pool.submit(capture_after, poll_interval)
+                
+                if image is not None:
+                    # 画面未变化时复用上次识别结果，否则重新识别场景
+                    scene_type, scene_info = self._recognize_scene_cached(image, recognize_scene)
                     
                     # 检查战斗是否结束
-                    if self.scene_recognizer.is_battle_complete(scene_type):
-                        self.logger.info(f"战斗结束，当前场景: {scene_type.name}")
+                    if is_battle_complete(scene_type):
+                        self.logger.info("战斗结束，当前场景: %s", scene_type.name)
                         self.current_scene = scene_type
                         return True
             
-            # 等待一段时间后再次检查
-            time.sleep(2.0)
+            self.logger.error("等待战斗结束超时")
+            return False
+        finally:
+            # 等待未完成的预取结束，避免与之后的截图争用截图通道和缓冲区
+            stop.set()
+            if not pending.cancel():
+                try:
+                    pending.result()
+                except Exception:
+                    pass
+    
+    def _recognize_scene_cached(self, image: np.ndarray, recognize_scene) -> Tuple[SceneType, dict]:
+        """识别场景，与上一帧几乎相同时直接返回缓存结果
         
-        self.logger.error("等待战斗结束超时")
-        return False
+        Args:
+            image: 当前屏幕图像
+            recognize_scene: 场景识别函数
+            
+        Returns:
+            (场景类型, 场景信息)
+        """
+        frame_hash = self.image_processor.difference_hash(image)
+        if (self._last_frame_hash is not None and
+                self.image_processor.hash_distance(frame_hash, self._last_frame_hash) <= FRAME_HASH_THRESHOLD):
+            return self._last_scene
+        
+        self._last_scene = recognize_scene(image)
+        self._last_frame_hash = frame_hash
+        return self._last_scene
     
     def get_current_score(self) -> int:
         """获取当前积分
@@ -434,13 +491,18 @@ class AutoFlow:
         Returns:
             随机延迟时间
         """
-        import random
-        
         # 计算延迟变化范围
         delay_variation = base_delay * variation
         
+        # 取一个[-1, 1)的抖动系数，用完后整批重新生成
+        if self._delay_idx >= DELAY_BUFFER_SIZE:
+            self._delay_buf = self._rng.uniform(-1.0, 1.0, DELAY_BUFFER_SIZE)
+            self._delay_idx = 0
+        jitter = float(self._delay_buf[self._delay_idx])
+        self._delay_idx += 1
+        
         # 生成随机延迟
-        random_delay = base_delay + random.uniform(-delay_variation, delay_variation)
+        random_delay = base_delay + delay_variation * jitter
         
         # 确保延迟不小于最小值
         min_delay = 0.1
@@ -463,14 +525,14 @@ class AutoFlow:
         
         # 更新操作计数和时间
         self.operation_count += 1
-        self.last_operation_time = time.time()
+        self.last_operation_time = time.monotonic()
         
         # 每10次操作增加一次长延迟
         if self.operation_count % 10 == 0:
             random_delay += self._get_random_delay(1.0)
-            self.logger.debug(f"第 {self.operation_count} 次操作，增加额外延迟")
+            self.logger.debug("第 %d 次操作，增加额外延迟", self.operation_count)
         
-        self.logger.debug(f"操作延迟: {random_delay:.3f}秒")
+        self.logger.debug("操作延迟: %.3f秒", random_delay)
         time.sleep(random_delay)
     
     def _tap_safe(self, x: int, y: int, delay_type: str = 'normal') -> bool:
@@ -4,14 +4,52 @@
 装备识别与自动穿戴模块
 """
 
+import os
 import re
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, List, Tuple
 
+# google-re2为可选依赖（线性时间匹配），未安装时使用标准库re
+try:
+    import re2 as regex
+except ImportError:
+    regex = re
+
+# 多个装备区域并行预处理（OpenCV运算期间释放GIL），所有识别器共用，线程按需创建
+_PREPROCESS_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+# 装备信息提取规则，导入时编译一次
+_LEVEL_RE = regex.compile(r'等级(\d+)')
+_STAR_RE = regex.compile(r'(\d+)星')
+
+# 属性提取规则: (组名, 关键字, 属性名)
+_ATTR_RULES = [
+    ('crit_rate', r'暴击', '暴击'),
+    ('crit_dmg', r'暴伤', '暴伤'),
+    ('atk', r'攻击', '攻击'),
+    ('spd', r'速度', '速度'),
+    ('def', r'防御', '防御'),
+    ('hp', r'生命', '生命值'),
+    ('err', r'能量恢复', '能量恢复'),
+    ('ehr', r'效果命中', '效果命中'),
+    ('res', r'效果抵抗', '效果抵抗')
+]
+
+# 所有属性合并为一个正则，一次扫描文本；每个分支只有一个命名组捕获属性值
+# re2的\s只匹配ASCII空白，全角空格需单独列出
+_ATTR_RE = regex.compile('|'.join(
+    rf'{keyword}[\s　]*(?P<{group}>\d+(?:\.\d+)?)' for group, keyword, _ in _ATTR_RULES
+))
+_ATTR_NAMES = {group: name for group, _, name in _ATTR_RULES}
+
 class EquipmentRecognizer:
     """装备识别类"""
     
+    # 百分比属性，评分系数高于固定值属性
+    _PCT_ATTRS = frozenset({'暴击', '暴伤', '效果命中', '效果抵抗', '能量恢复'})
+    
     def __init__(self, ocr, image_processor, logger=None, config=None):
         """初始化装备识别器
         
@@ -38,6 +76,10 @@ class EquipmentRecognizer:
             "效果命中": 0.8,
             "效果抵抗": 0.7
         }
+        
+        # 评分用的配置派生常量，避免每件装备重复计算
+        self._level_scale = 20.0 / config.max_equipment_level if config else 0.0
+        self._optimal_attrs = frozenset(config.optimal_equipment_attributes) if config else frozenset()
     
     def recognize_equipment(self, image: np.ndarray, region: Tuple[int, int, int, int] = None) -> Optional[Dict]:
         """识别装备信息
@@ -62,19 +104,46 @@ class EquipmentRecognizer:
             # 使用OCR识别装备文本
             ocr_results = self.ocr.recognize(processed_image)
             
-            # 提取装备信息
-            equipment_info = self._extract_equipment_info(ocr_results)
-            
-            if equipment_info:
-                # 计算装备评分
-                equipment_info['score'] = self._calculate_equipment_score(equipment_info)
-                return equipment_info
-            
+            return self._build_equipment(ocr_results)
+        except Exception as e:
+            self.logger.error(f"装备识别失败: {str(e)}", exc_info=True)
             return None
+    
+    def _prepare_region(self, image: np.ndarray, region: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+        """裁剪并预处理单个装备区域，出错时只放弃该区域
+        
+        Args:
+            image: 包含装备的图像
+            region: 装备区域坐标 (x, y, w, h)
+            
+        Returns:
+            预处理后的图像，失败返回None
+        """
+        try:
+            return self.image_processor.preprocess(self.image_processor.crop(image, *region))
         except Exception as e:
             self.logger.error(f"装备识别失败: {str(e)}", exc_info=True)
             return None
     
+    def _build_equipment(self, ocr_results: List[Dict]) -> Optional[Dict]:
+        """由OCR结果生成带评分的装备信息
+        
+        Args:
+            ocr_results: OCR识别结果
+            
+        Returns:
+            装备信息字典，失败返回None
+        """
+        # 提取装备信息
+        equipment_info = self._extract_equipment_info(ocr_results)
+        
+        if equipment_info:
+            # 计算装备评分
+            equipment_info['score'] = self._calculate_equipment_score(equipment_info)
+            return equipment_info
+        
+        return None
+    
     def _extract_equipment_info(self, ocr_results: List[Dict]) -> Dict:
         """从OCR结果中提取装备信息
         
@@ -99,12 +168,12 @@ class EquipmentRecognizer:
         self.logger.debug(f"装备OCR文本: {full_text}")
         
         # 提取装备等级
-        level_match = re.search(r'等级(\d+)', full_text)
+        level_match = _LEVEL_RE.search(full_text)
         if level_match:
             equipment_info['level'] = int(level_match.group(1))
         
         # 提取装备稀有度（星级）
-        star_match = re.search(r'(\d+)星', full_text)
+        star_match = _STAR_RE.search(full_text)
         if star_match:
             equipment_info['rarity'] = int(star_match.group(1))
         else:
@@ -142,24 +211,10 @@ class EquipmentRecognizer:
         """
         attributes = {}
         
-        # 属性提取规则
-        attribute_patterns = [
-            (r'暴击\s*(\d+(?:\.\d+)?)%?', '暴击'),
-            (r'暴伤\s*(\d+(?:\.\d+)?)%?', '暴伤'),
-            (r'攻击\s*(\d+(?:\.\d+)?)', '攻击'),
-            (r'速度\s*(\d+(?:\.\d+)?)', '速度'),
-            (r'防御\s*(\d+(?:\.\d+)?)', '防御'),
-            (r'生命\s*(\d+(?:\.\d+)?)', '生命值'),
-            (r'能量恢复\s*(\d+(?:\.\d+)?)%?', '能量恢复'),
-            (r'效果命中\s*(\d+(?:\.\d+)?)%?', '效果命中'),
-            (r'效果抵抗\s*(\d+(?:\.\d+)?)%?', '效果抵抗')
-        ]
-        
-        for pattern, attr_name in attribute_patterns:
-            matches = re.findall(pattern, text)
-            if matches:
-                value = float(matches[0])
-                attributes[attr_name] = value
+        # 按出现顺序扫描，每个属性只取第一次出现
+        for match in _ATTR_RE.finditer(text):
+            group = match.lastgroup
+            attributes.setdefault(_ATTR_NAMES[group], float(match.group(group)))
         
         return attributes
     
@@ -178,26 +233,19 @@ class EquipmentRecognizer:
         rarity_score = equipment_info['rarity'] * 10
         
         # 等级分
-        level_score = (equipment_info['level'] / self.config.max_equipment_level) * 20
+        level_score = equipment_info['level'] * self._level_scale
         
-        # 属性分
+        # 属性分：百分比属性系数0.1，固定值属性系数0.05
+        weights = self.attribute_weights
+        pct_attrs = self._PCT_ATTRS
         attribute_score = 0.0
         for attr_name, value in equipment_info['attributes'].items():
-            weight = self.attribute_weights.get(attr_name, 0.5)
-            
-            # 根据属性类型调整评分
-            if attr_name in ['暴击', '暴伤', '效果命中', '效果抵抗', '能量恢复']:
-                # 百分比属性
-                attribute_score += value * weight * 0.1
-            else:
-                # 固定值属性
-                attribute_score += value * weight * 0.05
+            factor = 0.1 if attr_name in pct_attrs else 0.05
+            attribute_score += value * weights.get(attr_name, 0.5) * factor
         
         # 最优属性加成
-        optimal_bonus = 0.0
-        for attr in equipment_info['sub_attributes']:
-            if attr in self.config.optimal_equipment_attributes:
-                optimal_bonus += 5.0
+        optimal_attrs = self._optimal_attrs
+        optimal_bonus = 5.0 * sum(1 for attr in equipment_info['sub_attributes'] if attr in optimal_attrs)
         
         # 总评分
         total_score = rarity_score + level_score + attribute_score + optimal_bonus
@@ -219,8 +267,9 @@ class EquipmentRecognizer:
             return True
         
         # 检查是否有最优属性优势
-        new_optimal_count = sum(1 for attr in new_equip['sub_attributes'] if attr in self.config.optimal_equipment_attributes)
-        current_optimal_count = sum(1 for attr in current_equip['sub_attributes'] if attr in self.config.optimal_equipment_attributes)
+        optimal_attrs = self._optimal_attrs
+        new_optimal_count = sum(1 for attr in new_equip['sub_attributes'] if attr in optimal_attrs)
+        current_optimal_count = sum(1 for attr in current_equip['sub_attributes'] if attr in optimal_attrs)
         
         if new_optimal_count > current_optimal_count:
             return True
@@ -239,9 +288,8 @@ class EquipmentRecognizer:
         if not equipment_list:
             return None
         
-        # 按评分排序
-        sorted_equipment = sorted(equipment_list, key=lambda x: x['score'], reverse=True)
-        return sorted_equipment[0]
+        # 只需要最高分，单次遍历即可，无需排序（同分时取第一个，与原排序结果一致）
+        return max(equipment_list, key=lambda x: x['score'])
     
     def recognize_equipment_list(self, image: np.ndarray, equipment_regions: List[Tuple[int, int, int, int]]) -> List[Dict]:
         """识别多个装备
@@ -255,9 +303,24 @@ class EquipmentRecognizer:
         """
         equipment_list = []
         
-        for i, region in enumerate(equipment_regions):
+        # 先并行完成所有区域的裁剪和预处理，再一次性交给OCR；预处理失败的区域跳过
+        processed = [
+            (i, processed_image)
+            for i, processed_image in enumerate(_PREPROCESS_POOL.map(
+                lambda region: self._prepare_region(image, region),
+                equipment_regions
+            ))
+            if processed_image is not None
+        ]
+        
+        batch_results = self.ocr.recognize_batch([processed_image for _, processed_image in processed])
+        for (i, _), ocr_results in zip(processed, batch_results):
             self.logger.debug(f"识别第 {i + 1} 个装备")
-            equipment = self.recognize_equipment(image, region)
+            try:
+                equipment = self._build_equipment(ocr_results)
+            except Exception as e:
+                self.logger.error(f"装备识别失败: {str(e)}", exc_info=True)
+                continue
             if equipment:
                 equipment_list.append(equipment)
         
@@ -6,11 +6,19 @@
 """
 
 import os
+import threading
 import cv2
 import numpy as np
 from datetime import datetime
 from typing import Optional, Tuple
 
+# 预处理的最大边长，超过时先缩小（OCR对更高分辨率没有收益）
+MAX_PREPROCESS_SIZE = 1440
+
+# 自适应阈值的默认邻域大小（奇数）和偏移量
+ADAPTIVE_BLOCK_SIZE = 11
+ADAPTIVE_C = 2
+
 class ImageProcessor:
     """图像处理类"""
     
@@ -37,6 +45,12 @@ class ImageProcessor:
         self.current_resolution = (1080, 2340)
         self.scale_factor = 1.0
         
+        # 已确认存在的保存目录，避免每次保存都检查/创建目录
+        self._known_dirs = set()
+        
+        # 预处理中间结果的复用缓冲区，按图像尺寸懒分配；每个线程各用一组，可并行预处理
+        self._local = threading.local()
+        
     def load_image(self, image_path: str) -> Optional[np.ndarray]:
         """加载图像
         
@@ -75,8 +89,9 @@ class ImageProcessor:
         try:
             # 创建保存目录
             save_dir = os.path.dirname(save_path)
-            if save_dir and not os.path.exists(save_dir):
-                os.makedirs(save_dir)
+            if save_dir and save_dir not in self._known_dirs:
+                os.makedirs(save_dir, exist_ok=True)
+                self._known_dirs.add(save_dir)
             
             # 保存图像
             success = cv2.imwrite(save_path, image)
@@ -99,31 +114,80 @@ class ImageProcessor:
             预处理后的图像
         """
         try:
-            processed = image.copy()
+            # 各步骤都不修改输入，中间结果在两块缓冲区之间交替写入
+            processed = self._limit_size(image)
             
             # 1. 转为灰度图
-            if self.config.grayscale:
-                processed = self.to_grayscale(processed)
+            if self.config.grayscale and len(processed.shape) == 3 and processed.shape[2] == 3:
+                processed = cv2.cvtColor(processed, cv2.COLOR_BGR2GRAY,
+                                         dst=self._scratch_buffer(0, processed.shape[:2]))
             
             # 2. 调整亮度和对比度
-            processed = self.adjust_brightness_contrast(
-                processed, 
-                brightness=self.config.brightness, 
-                contrast=self.config.contrast
+            processed = cv2.convertScaleAbs(
+                processed,
+                dst=self._scratch_buffer(1, processed.shape),
+                alpha=self.config.contrast,
+                beta=self.config.brightness
             )
             
+            # 3+4. 自适应阈值（配置adaptive_threshold启用）：局部高斯加权均值和阈值判断一次完成，
+            # 代替模糊+全局阈值，光照不均时效果更好
+            if getattr(self.config, 'adaptive_threshold', False):
+                block_size = getattr(self.config, 'adaptive_block_size', ADAPTIVE_BLOCK_SIZE) | 1
+                return cv2.adaptiveThreshold(self.to_grayscale(processed), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                             cv2.THRESH_BINARY, max(3, block_size), ADAPTIVE_C)
+            
             # 3. 模糊处理（降噪）
-            if self.config.blur_kernel > 0:
-                processed = self.blur(processed, kernel_size=self.config.blur_kernel)
+            kernel_size = self.config.blur_kernel
+            if kernel_size > 0:
+                processed = cv2.GaussianBlur(processed, (kernel_size, kernel_size), 0,
+                                             dst=self._scratch_buffer(0, processed.shape))
             
-            # 4. 二值化
-            processed = self.binarize(processed, threshold=self.config.threshold)
+            # 4. 二值化（结果单独分配，调用方可长期持有）
+            processed = self._binarize_gray(self.to_grayscale(processed), self.config.threshold)
             
             return processed
         except Exception as e:
             self.logger.error(f"图像预处理失败: {str(e)}")
             return image
     
+    def _limit_size(self, image: np.ndarray) -> np.ndarray:
+        """大图先按比例缩小到MAX_PREPROCESS_SIZE以内
+        
+        Args:
+            image: 输入图像
+            
+        Returns:
+            缩小后的图像（无需缩小时返回原图）
+        """
+        h, w = image.shape[:2]
+        longest = max(h, w)
+        if longest <= MAX_PREPROCESS_SIZE:
+            return image
+        
+        scale = MAX_PREPROCESS_SIZE / longest
+        return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    
+    def _scratch_buffer(self, index: int, shape: Tuple[int, ...]) -> np.ndarray:
+        """获取指定尺寸的复用缓冲区，尺寸变化时重新分配
+        
+        Args:
+            index: 缓冲区编号（0或1）
+            shape: 所需数组形状
+            
+        Returns:
+            uint8缓冲区
+        """
+        scratch = getattr(self._local, 'scratch', None)
+        if scratch is None:
+            scratch = self._local.scratch = [None, None]
+        
+        buf = scratch[index]
+        if buf is None or buf.shape != shape:
+            buf = np.empty(shape, dtype=np.uint8)
+            scratch[index] = buf
+        return buf
+    
     def to_grayscale(self, image: np.ndarray) -> np.ndarray:
         """转为灰度图
         
@@ -175,12 +239,19 @@ class ImageProcessor:
         Returns:
             二值化后的图像
         """
-        # 如果是彩色图像，转为灰度图
-        if len(image.shape) == 3:
-            image = self.to_grayscale(image)
+        return self._binarize_gray(self.to_grayscale(image), threshold)
+    
+    def _binarize_gray(self, gray: np.ndarray, threshold: int) -> np.ndarray:
+        """对灰度图二值化（调用方保证输入已是灰度图）
         
-        # 二值化处理
-        _, binary = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)
+        Args:
+            gray: 灰度图像
+            threshold: 二值化阈值
+            
+        Returns:
+            二值化后的图像
+        """
+        _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
         return binary
     
     def resize(self, image: np.ndarray, width: int = None, height: int = None, keep_ratio: bool = True) -> np.ndarray:
@@ -223,7 +294,7 @@ class ImageProcessor:
             h: 高度
             
         Returns:
-            裁剪后的图像
+            裁剪后的图像，是原图的视图（不复制数据），修改它会同时修改原图
         """
         h_img, w_img = image.shape[:2]
         
@@ -251,16 +322,9 @@ class ImageProcessor:
             (匹配度, (x, y, w, h))，失败返回None
         """
         try:
-            # 如果是彩色图像，转为灰度图
-            if len(image.shape) == 3:
-                image_gray = self.to_grayscale(image)
-            else:
-                image_gray = image
-            
-            if len(template.shape) == 3:
-                template_gray = self.to_grayscale(template)
-            else:
-                template_gray = template
+            # 彩色图像转为灰度图，灰度图原样返回
+            image_gray = self.to_grayscale(image)
+            template_gray = self.to_grayscale(template)
             
             # 模板匹配
             result = cv2.matchTemplate(image_gray, template_gray, cv2.TM_CCOEFF_NORMED)
@@ -297,7 +361,7 @@ class ImageProcessor:
         x, y, w, h = region
         return self.crop(image, x, y, w, h)
     
-    def draw_rectangle(self, image: np.ndarray, x: int, y: int, w: int, h: int, color: Tuple[int, int, int] = (0, 255, 0), thickness: int = 2) -> np.ndarray:
+    def draw_rectangle(self, image: np.ndarray, x: int, y: int, w: int, h: int, color: Tuple[int, int, int] = (0, 255, 0), thickness: int = 2, inplace: bool = False) -> np.ndarray:
         """绘制矩形
         
         Args:
@@ -308,15 +372,16 @@ class ImageProcessor:
             h: 高度
             color: 矩形颜色 (B, G, R)
             thickness: 线条粗细
+            inplace: 是否直接在输入图像上绘制（省去整图复制，会修改输入）
             
         Returns:
             绘制后的图像
         """
-        drawn = image.copy()
+        drawn = image if inplace else image.copy()
         cv2.rectangle(drawn, (x, y), (x + w, y + h), color, thickness)
         return drawn
     
-    def draw_text(self, image: np.ndarray, text: str, x: int, y: int, color: Tuple[int, int, int] = (0, 255, 0), font_size: float = 0.5, thickness: int = 1) -> np.ndarray:
+    def draw_text(self, image: np.ndarray, text: str, x: int, y: int, color: Tuple[int, int, int] = (0, 255, 0), font_size: float = 0.5, thickness: int = 1, inplace: bool = False) -> np.ndarray:
         """绘制文本
         
         Args:
@@ -327,11 +392,12 @@ class ImageProcessor:
             color: 文本颜色 (B, G, R)
             font_size: 字体大小
             thickness: 线条粗细
+            inplace: 是否直接在输入图像上绘制（省去整图复制，会修改输入）
             
         Returns:
             绘制后的图像
         """
-        drawn = image.copy()
+        drawn = image if inplace else image.copy()
         font = cv2.FONT_HERSHEY_SIMPLEX
         cv2.putText(drawn, text, (x, y), font, font_size, color, thickness, cv2.LINE_AA)
         return drawn
@@ -347,11 +413,7 @@ class ImageProcessor:
         Returns:
             边缘图像
         """
-        # 如果是彩色图像，转为灰度图
-        if len(image.shape) == 3:
-            image = self.to_grayscale(image)
-        
-        return cv2.Canny(image, low_threshold, high_threshold)
+        return cv2.Canny(self.to_grayscale(image), low_threshold, high_threshold)
     
     def count_pixels(self, image: np.ndarray, min_value: int = 0, max_value: int = 255) -> int:
         """统计像素数量
@@ -364,11 +426,40 @@ class ImageProcessor:
         Returns:
             符合条件的像素数量
         """
+        # inRange单次遍历生成掩码，避免两个布尔临时数组
+        mask = cv2.inRange(self.to_grayscale(image), min_value, max_value)
+        return cv2.countNonZero(mask)
+    
+    def difference_hash(self, image: np.ndarray, hash_size: int = 16) -> int:
+        """计算图像的差异哈希（dHash），用于快速判断两帧是否几乎相同
+        
+        Args:
+            image: 输入图像
+            hash_size: 哈希网格边长，结果共 hash_size * hash_size 位
+            
+        Returns:
+            哈希值
+        """
         # 如果是彩色图像，转为灰度图
         if len(image.shape) == 3:
             image = self.to_grayscale(image)
         
-        return np.sum((image >= min_value) & (image <= max_value))
+        small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+        diff = small[:, 1:] > small[:, :-1]
+        return int.from_bytes(np.packbits(diff).tobytes(), 'big')
+    
+    @staticmethod
+    def hash_distance(hash1: int, hash2: int) -> int:
+        """计算两个哈希值的汉明距离
+        
+        Args:
+            hash1: 哈希值1
+            hash2: 哈希值2
+            
+        Returns:
+            不同的位数
+        """
+        return bin(hash1 ^ hash2).count('1')
     
     def get_average_color(self, image: np.ndarray) -> Tuple[int, int, int]:
         """获取平均颜色
@@ -379,14 +470,15 @@ class ImageProcessor:
         Returns:
             平均颜色 (B, G, R) 或灰度值
         """
+        # cv2.mean单次遍历，不产生float64中间数组；结果固定为4个通道
+        avg = cv2.mean(image)
         if len(image.shape) == 3:
             # 彩色图像
-            avg_color = np.mean(image, axis=(0, 1))
-            return tuple(map(int, avg_color))
+            return tuple(map(int, avg[:image.shape[2]]))
         else:
             # 灰度图像
-            avg_gray = np.mean(image)
-            return (int(avg_gray), int(avg_gray), int(avg_gray))
+            avg_gray = int(avg[0])
+            return (avg_gray, avg_gray, avg_gray)
     
     def rotate(self, image: np.ndarray, angle: float, center: Tuple[int, int] = None, scale: float = 1.0) -> np.ndarray:
         """旋转图像
@@ -454,11 +546,9 @@ class ImageProcessor:
         Returns:
             缩放后的区域 (x, y, w, h)
         """
+        scale = self.scale_factor
         x, y, w, h = region
-        scaled_x, scaled_y = self.scale_coordinates(x, y)
-        scaled_w = int(w * self.scale_factor)
-        scaled_h = int(h * self.scale_factor)
-        return (scaled_x, scaled_y, scaled_w, scaled_h)
+        return (int(x * scale), int(y * scale), int(w * scale), int(h * scale))
     
     def adaptive_preprocess(self, image: np.ndarray) -> np.ndarray:
         """自适应图像预处理，根据图像特征调整处理参数
@@ -470,19 +560,18 @@ class ImageProcessor:
             预处理后的图像
         """
         try:
-            processed = image.copy()
-            h, w = processed.shape[:2]
+            h, w = image.shape[:2]
             
             # 自动调整分辨率
             self.set_current_resolution(w, h)
             
-            # 1. 转为灰度图（如果配置启用）
-            if self.config.grayscale:
-                processed = self.to_grayscale(processed)
+            # 1. 转为灰度图
+            # 输出是二值灰度图，先转换一次，亮度统计、边缘强度和Otsu阈值共用同一灰度图
+            processed = self.to_grayscale(self._limit_size(image))
             
             # 2. 自动调整亮度和对比度
             # 计算图像亮度均值
-            avg_brightness = np.mean(processed)
+            avg_brightness = cv2.mean(processed)[0]
             
             # 根据亮度自动调整参数
             if avg_brightness < 100:
@@ -505,12 +594,10 @@ class ImageProcessor:
             blur_kernel = self.config.blur_kernel
             
             # 计算图像梯度（边缘强度）
-            if len(processed.shape) == 3:
-                gray = self.to_grayscale(processed)
-            else:
-                gray = processed
-            
-            edge_strength = np.mean(cv2.Laplacian(gray, cv2.CV_64F).var())
+            # 8位输入的Laplacian结果在int16范围内，meanStdDev一次遍历得到方差
+            laplacian = cv2.Laplacian(processed, cv2.CV_16S)
+            _, stddev = cv2.meanStdDev(laplacian)
+            edge_strength = float(stddev[0, 0]) ** 2
             
             if edge_strength > 100:
                 # 边缘较强，降低模糊程度
@@ -523,14 +610,8 @@ class ImageProcessor:
                 processed = self.blur(processed, blur_kernel)
             
             # 4. 自适应二值化
-            # 根据图像特征选择合适的阈值
-            if len(processed.shape) == 3:
-                gray = self.to_grayscale(processed)
-            else:
-                gray = processed
-            
-            # 使用Otsu阈值
-            _, processed = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            # 根据图像特征选择合适的阈值，使用Otsu阈值
+            _, processed = cv2.threshold(processed, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
             
             return processed
         except Exception as e:
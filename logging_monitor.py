@@ -6,11 +6,111 @@
 """
 
 import os
+import json
+import mmap
+import shutil
+from collections import deque
+from itertools import islice
+import time
+import atexit
+import queue
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
+from types import MappingProxyType
 import threading
 
+# orjson为可选依赖，未安装时使用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """带写缓冲的日志轮转处理器
+    
+    标准RotatingFileHandler每条日志都会检查文件状态、seek到文件末尾并flush，
+    每条日志至少一次write系统调用。这里在内存中记录文件大小，日志先写入64KB缓冲区，
+    超过flush_interval秒或遇到ERROR及以上级别的日志时才写入磁盘。
+    """
+    
+    BUFFER_SIZE = 64 * 1024
+    
+    def __init__(self, filename: str, maxBytes: int = 0, backupCount: int = 0, encoding: str = None,
+                 flush_interval: float = 1.0, flush_level: int = logging.ERROR):
+        """初始化处理器
+        
+        Args:
+            filename: 日志文件路径
+            maxBytes: 单个日志文件最大大小（字节），0表示不轮转
+            backupCount: 备份文件数量
+            encoding: 文件编码
+            flush_interval: 最长缓冲时间（秒），空闲时由后台线程定时写入
+            flush_level: 达到该级别的日志立即写入磁盘
+        """
+        self._size = 0
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._last_flush = time.monotonic()
+        
+        # 没有新日志时也定时写入缓冲区内容
+        self._stop_flush = threading.Event()
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+    
+    def _open(self):
+        """以大缓冲区打开日志文件，并记录当前文件大小"""
+        stream = open(self.baseFilename, self.mode, buffering=self.BUFFER_SIZE,
+                      encoding=self.encoding, errors=self.errors)
+        self._size = stream.seek(0, 2)
+        return stream
+    
+    def emit(self, record: logging.LogRecord):
+        """写入一条日志，按内存中的文件大小判断是否需要轮转"""
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            
+            # maxBytes按字节计算，中文日志按编码后的长度累计
+            size = len(msg.encode(self.stream.encoding, self.stream.errors or 'strict'))
+            if self.maxBytes > 0 and self._size + size >= self.maxBytes:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            
+            self.stream.write(msg)
+            self._size += size
+            
+            now = time.monotonic()
+            if record.levelno >= self.flush_level or now - self._last_flush >= self.flush_interval:
+                self.stream.flush()
+                self._last_flush = now
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+    
+    def truncate(self):
+        """清空当前日志文件，保持文件句柄打开"""
+        with self.lock:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.flush()
+            self.stream.seek(0)
+            self.stream.truncate(0)
+            self._size = 0
+    
+    def _flush_loop(self):
+        """后台定时写入缓冲区"""
+        while not self._stop_flush.wait(self.flush_interval):
+            self.flush()
+    
+    def close(self):
+        """停止定时写入并关闭文件"""
+        self._stop_flush.set()
+        super().close()
+
 class Logger:
     """日志类"""
     
@@ -32,10 +132,15 @@ class Logger:
             os.makedirs(log_dir)
         
         # 初始化日志配置
+        # 调用方只把日志记录放入队列，格式化和文件/控制台输出由后台监听线程完成
+        self._listener = None
+        # 写日志无需加锁（logging本身线程安全），只在替换/停启处理器时加锁
+        self._handler_lock = threading.RLock()
+        self._record_factory = logging.getLogRecordFactory()
         self.logger = self._setup_logger()
         
-        # 线程锁，确保日志线程安全
-        self.lock = threading.Lock()
+        # 监听线程是守护线程，退出时需写完队列中剩余的日志
+        atexit.register(self.shutdown)
         
     def _setup_logger(self) -> logging.Logger:
         """配置日志记录器
@@ -49,6 +154,7 @@ class Logger:
         
         # 清除已有的处理器
         logger.handlers.clear()
+        handlers = []
         
         # 日志格式
         formatter = logging.Formatter(
@@ -57,70 +163,101 @@ class Logger:
         )
         
         # 文件处理器，支持日志轮转
-        file_handler = RotatingFileHandler(
+        file_handler = BufferedRotatingFileHandler(
             self.log_file,
             maxBytes=10 * 1024 * 1024,  # 10MB
             backupCount=5
         )
         file_handler.setLevel(self.log_level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
         
         # 控制台处理器
         if self.enable_console:
             console_handler = logging.StreamHandler()
             console_handler.setLevel(self.log_level)
             console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
+        
+        # 实际处理器挂在后台监听线程上，记录器只保留队列处理器
+        self._listener = QueueListener(queue.SimpleQueue(), *handlers, respect_handler_level=True)
+        logger.addHandler(QueueHandler(self._listener.queue))
+        self._listener.start()
         
         return logger
     
-    def debug(self, message: str):
+    def shutdown(self):
+        """停止后台日志线程，写完队列中剩余的日志并关闭处理器"""
+        with self._handler_lock:
+            if self._listener is None:
+                return
+            
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+    
+    def debug(self, message: str, *args):
         """记录DEBUG级别的日志
         
         Args:
             message: 日志消息
+            *args: 消息格式化参数，仅在日志实际输出时格式化
         """
-        with self.lock:
-            self.logger.debug(message)
+        self.logger.debug(message, *args)
     
-    def info(self, message: str):
+    def info(self, message: str, *args):
         """记录INFO级别的日志
         
         Args:
             message: 日志消息
+            *args: 消息格式化参数，仅在日志实际输出时格式化
         """
-        with self.lock:
-            self.logger.info(message)
+        self.logger.info(message, *args)
     
-    def warning(self, message: str):
+    def warning(self, message: str, *args):
         """记录WARNING级别的日志
         
         Args:
             message: 日志消息
+            *args: 消息格式化参数，仅在日志实际输出时格式化
         """
-        with self.lock:
-            self.logger.warning(message)
+        self.logger.warning(message, *args)
     
-    def error(self, message: str, exc_info: bool = False):
+    def error(self, message: str, *args, exc_info: bool = False):
         """记录ERROR级别的日志
         
         Args:
             message: 日志消息
+            *args: 消息格式化参数，仅在日志实际输出时格式化
             exc_info: 是否记录异常信息
         """
-        with self.lock:
-            self.logger.error(message, exc_info=exc_info)
+        self.logger.error(message, *args, exc_info=exc_info)
     
-    def critical(self, message: str, exc_info: bool = False):
+    def critical(self, message: str, *args, exc_info: bool = False):
         """记录CRITICAL级别的日志
         
         Args:
             message: 日志消息
+            *args: 消息格式化参数，仅在日志实际输出时格式化
             exc_info: 是否记录异常信息
         """
-        with self.lock:
-            self.logger.critical(message, exc_info=exc_info)
+        self.logger.critical(message, *args, exc_info=exc_info)
+    
+    def log_direct(self, level: int, message: str, *args):
+        """直接构造日志记录交给处理器，跳过logger.info中的findCaller栈帧查找
+        
+        日志格式不包含文件名和行号，高频日志可以省去这部分开销
+        
+        Args:
+            level: 日志级别（logging.INFO等）
+            message: 日志消息
+            *args: 消息格式化参数，仅在日志实际输出时格式化
+        """
+        logger = self.logger
+        if not logger.isEnabledFor(level):
+            return
+        logger.handle(self._record_factory(logger.name, level, "(unknown file)", 0, message, args, None))
     
     def set_level(self, level: str):
         """设置日志级别
@@ -129,14 +266,39 @@ class Logger:
             level: 日志级别
         """
         level = level.upper()
-        self.log_level = level
-        
-        # 更新日志记录器级别
-        self.logger.setLevel(level)
+        with self._handler_lock:
+            self.log_level = level
+            
+            # 更新日志记录器级别
+            self.logger.setLevel(level)
+            
+            # 更新所有处理器的级别
+            for handler in self.logger.handlers:
+                handler.setLevel(level)
+            if self._listener is not None:
+                for handler in self._listener.handlers:
+                    handler.setLevel(level)
+    
+    def _flush_handlers(self):
+        """将队列和处理器缓冲区中的日志全部写入文件"""
+        with self._handler_lock:
+            if self._listener is not None:
+                # stop会等待监听线程处理完队列中已有的日志，之后重新启动
+                self._listener.stop()
+                self._listener.start()
+                for handler in self._listener.handlers:
+                    handler.flush()
+    
+    def isEnabledFor(self, level: int) -> bool:
+        """检查指定级别的日志是否会被输出，与logging.Logger接口一致
         
-        # 更新所有处理器的级别
-        for handler in self.logger.handlers:
-            handler.setLevel(level)
+        Args:
+            level: 日志级别（logging.INFO等）
+            
+        Returns:
+            会输出返回True
+        """
+        return self.logger.isEnabledFor(level)
     
     def get_log_file_path(self) -> str:
         """获取日志文件路径
@@ -156,13 +318,26 @@ class Logger:
             日志内容
         """
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                log_lines = f.readlines()
+            self._flush_handlers()
+            
+            with open(self.log_file, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return ""
+                
+                # 从文件末尾向前查找换行符，只访问文件最后几页，不读取整个文件
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    end = len(mm)
+                    pos = end - 1 if mm[end - 1] == ord('\n') else end
+                    for _ in range(lines):
+                        pos = mm.rfind(b'\n', 0, pos)
+                        if pos < 0:
+                            break
+                    content = mm[pos + 1:end].decode('utf-8')
             
-            # 返回最后N行
-            return ''.join(log_lines[-lines:])
+            # 与文本模式读取一致，统一换行符
+            return content.replace('\r\n', '\n').replace('\r', '\n')
         except Exception as e:
-            self.error(f"读取日志文件失败: {str(e)}")
+            self.error("读取日志文件失败: %s", e)
             return ""
     
     def clear_log(self) -> bool:
@@ -172,19 +347,20 @@ class Logger:
             成功返回True，失败返回False
         """
         try:
-            # 关闭所有处理器
-            for handler in self.logger.handlers:
-                handler.close()
-            
-            # 清空日志文件
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                f.write('')
-            
-            # 重新设置日志处理器
-            self.logger = self._setup_logger()
+            with self._handler_lock:
+                # 先写完队列中已有的日志，再原地清空文件，不重建处理器
+                self._flush_handlers()
+                
+                handlers = self._listener.handlers if self._listener is not None else ()
+                file_handler = next((h for h in handlers if isinstance(h, BufferedRotatingFileHandler)), None)
+                if file_handler is not None:
+                    file_handler.truncate()
+                else:
+                    with open(self.log_file, 'w', encoding='utf-8'):
+                        pass
             return True
         except Exception as e:
-            self.error(f"清空日志文件失败: {str(e)}")
+            self.error("清空日志文件失败: %s", e)
             return False
     
     def export_log(self, export_path: str = None) -> str:
@@ -202,20 +378,29 @@ class Logger:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 export_path = f"starrail_bot_log_{timestamp}.log"
             
-            # 复制日志文件
-            with open(self.log_file, 'r', encoding='utf-8') as src:
-                with open(export_path, 'w', encoding='utf-8') as dst:
-                    dst.write(src.read())
+            # 复制日志文件（copyfile在Linux上使用sendfile，在内核中直接复制）
+            self._flush_handlers()
+            shutil.copyfile(self.log_file, export_path)
             
-            self.info(f"日志已导出到: {export_path}")
+            self.info("日志已导出到: %s", export_path)
             return export_path
         except Exception as e:
-            self.error(f"导出日志文件失败: {str(e)}")
+            self.error("导出日志文件失败: %s", e)
             return ""
 
 class StatusMonitor:
     """状态监控类"""
     
+    # 游戏数据变化的日志格式，参数在日志实际输出时才格式化
+    _CHANGES_FMT = "状态变化: %s"
+    
+    # update_with_game_data参数名与状态字段的对应关系
+    _GAME_DATA_FIELDS = (
+        ('score', 'current_score'),
+        ('credits', 'current_credits'),
+        ('equipment_score', 'equipment_score'),
+    )
+    
     def __init__(self, logger: Logger):
         """初始化状态监控
         
@@ -224,6 +409,8 @@ class StatusMonitor:
         """
         self.logger = logger
         self.start_time = datetime.now()
+        # 计算运行时长使用单调时钟，不受系统时间调整影响
+        self._start_monotonic = time.monotonic()
         
         # 状态信息
         self.status = {
@@ -240,10 +427,18 @@ class StatusMonitor:
             'equipment_score': 0,
             'transaction_count': 0
         }
+        # 只读状态快照，写入方在锁内生成新字典后整体替换，读取方无需加锁
+        self._status_snapshot = MappingProxyType(self.status)
+        # 状态字符串缓存 (快照, 字符串)，快照被替换后才重新拼接
+        self._status_str_cache = None
         
-        # 操作日志记录
-        self.operation_log = []
+        # 操作日志记录，超过上限时自动丢弃最早的条目
         self.max_log_entries = 1000  # 最大日志条目数
+        self.operation_log = deque(maxlen=self.max_log_entries)
+        
+        # 操作统计，随操作日志的追加和淘汰增量更新
+        self._success_ops = 0
+        self._op_types = {}
         
         # 线程锁
         self.lock = threading.Lock()
@@ -255,41 +450,62 @@ class StatusMonitor:
             **kwargs: 要更新的状态字段
         """
         with self.lock:
-            for key, value in kwargs.items():
-                if key in self.status:
-                    self.status[key] = value
+            changes = {key: value for key, value in kwargs.items() if key in self.status}
             
             # 更新执行时间
-            self.status['execution_time'] = str(datetime.now() - self.start_time).split('.')[0]
+            changes['execution_time'] = self._elapsed_str()
+            self._publish_status(changes)
+    
+    def _elapsed_str(self) -> str:
+        """获取运行时长字符串
+        
+        Returns:
+            HH:MM:SS格式的运行时长
+        """
+        hours, rem = divmod(int(time.monotonic() - self._start_monotonic), 3600)
+        minutes, seconds = divmod(rem, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
     
-    def get_status(self) -> dict:
+    def _publish_status(self, changes: dict):
+        """复制当前状态并应用修改，发布新的只读快照（调用方需持有锁）
+        
+        Args:
+            changes: 要修改的状态字段
+        """
+        status = dict(self.status)
+        status.update(changes)
+        self.status = status
+        self._status_snapshot = MappingProxyType(status)
+    
+    def get_status(self) -> MappingProxyType:
         """获取当前状态
         
         Returns:
-            当前状态字典
+            当前状态的只读快照
         """
-        with self.lock:
-            return self.status.copy()
+        return self._status_snapshot
     
     def start_monitoring(self):
         """开始监控
         """
-        self.status['running'] = True
-        self.status['start_time'] = datetime.now()
+        with self.lock:
+            self._publish_status({'running': True, 'start_time': datetime.now()})
         self.logger.info("状态监控已启动")
     
     def stop_monitoring(self):
         """停止监控
         """
-        self.status['running'] = False
+        with self.lock:
+            self._publish_status({'running': False})
         self.logger.info("状态监控已停止")
     
     def log_status(self):
         """记录当前状态到日志
         """
-        with self.lock:
-            status_str = " | ".join([f"{k}: {v}" for k, v in self.status.items()])
-            self.logger.info(f"当前状态: {status_str}")
+        # INFO被过滤时不拼接状态字符串
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info("当前状态: %s", self.get_status_string())
     
     def get_status_string(self) -> str:
         """获取状态字符串
@@ -297,8 +513,13 @@ class StatusMonitor:
         Returns:
             状态字符串
         """
-        with self.lock:
-            return " | ".join([f"{k}: {v}" for k, v in self.status.items()])
+        # 快照不会被修改，缓存对应的仍是当前快照时直接返回
+        status = self._status_snapshot
+        cache = self._status_str_cache
+        if cache is None or cache[0] is not status:
+            cache = (status, " | ".join([f"{k}: {v}" for k, v in status.items()]))
+            self._status_str_cache = cache
+        return cache[1]
     
     def reset(self):
         """重置状态
@@ -315,30 +536,54 @@ class StatusMonitor:
             success: 操作是否成功
             details: 操作详细信息
         """
+        now = datetime.now()
         with self.lock:
             # 创建日志条目
             log_entry = {
-                'timestamp': datetime.now(),
+                'timestamp': now,
                 'operation': operation_name,
                 'success': success,
                 'details': details or {}
             }
             
-            # 添加到日志列表
+            # 添加到日志列表（deque达到上限时自动移除最早的日志，先扣除其统计）
+            if len(self.operation_log) == self.max_log_entries:
+                self._count_operation(self.operation_log[0], -1)
             self.operation_log.append(log_entry)
-            
-            # 限制日志数量
-            if len(self.operation_log) > self.max_log_entries:
-                self.operation_log.pop(0)  # 移除最早的日志
+            self._count_operation(log_entry, 1)
             
             # 更新状态
-            self.status['last_operation'] = operation_name
-            self.status['last_operation_time'] = datetime.now()
-            
-            # 记录到日志文件
-            status = "成功" if success else "失败"
-            details_str = f"，详情: {details}" if details else ""
-            self.logger.info(f"操作: {operation_name}，状态: {status}{details_str}")
+            self._publish_status({
+                'last_operation': operation_name,
+                'last_operation_time': now
+            })
+        
+        # 记录到日志文件（操作日志频率较高，直接构造日志记录）
+        status = "成功" if success else "失败"
+        if details:
+            self.logger.log_direct(logging.INFO, "操作: %s，状态: %s，详情: %s", operation_name, status, details)
+        else:
+            self.logger.log_direct(logging.INFO, "操作: %s，状态: %s", operation_name, status)
+    
+    def _count_operation(self, log_entry: dict, delta: int):
+        """更新操作统计（调用方需持有锁）
+        
+        Args:
+            log_entry: 操作日志条目
+            delta: 1表示新增条目，-1表示淘汰条目
+        """
+        op_name = log_entry['operation']
+        stats = self._op_types.get(op_name)
+        if stats is None:
+            stats = self._op_types[op_name] = {'total': 0, 'success': 0}
+        
+        stats['total'] += delta
+        if log_entry['success']:
+            stats['success'] += delta
+            self._success_ops += delta
+        
+        if stats['total'] == 0:
+            del self._op_types[op_name]
     
     def export_operation_log(self, export_path: str = None) -> str:
         """导出操作日志
@@ -355,15 +600,22 @@ class StatusMonitor:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 export_path = f"operation_log_{timestamp}.json"
             
-            # 导出为JSON格式
-            import json
-            with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(self.operation_log, f, ensure_ascii=False, indent=2, default=str)
+            with self.lock:
+                entries = list(self.operation_log)
             
-            self.logger.info(f"操作日志已导出到: {export_path}")
+            # 导出为JSON格式，orjson在C中直接序列化datetime，一次写入整个文件
+            if orjson is not None:
+                with open(export_path, 'wb') as f:
+                    f.write(orjson.dumps(entries, default=str,
+                                         option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            else:
+                with open(export_path, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f, ensure_ascii=False, indent=2, default=str)
+            
+            self.logger.info("操作日志已导出到: %s", export_path)
             return export_path
         except Exception as e:
-            self.logger.error(f"导出操作日志失败: {str(e)}")
+            self.logger.error("导出操作日志失败: %s", e)
             return ""
     
     def get_operation_log(self, limit: int = 50) -> list:
@@ -376,7 +628,8 @@ class StatusMonitor:
             操作日志列表
         """
         with self.lock:
-            return self.operation_log[-limit:]
+            start = max(0, len(self.operation_log) - limit)
+            return list(islice(self.operation_log, start, None))
     
     def get_operation_summary(self) -> dict:
         """获取操作统计摘要
@@ -386,24 +639,15 @@ class StatusMonitor:
         """
         with self.lock:
             total_operations = len(self.operation_log)
-            success_operations = sum(1 for log in self.operation_log if log['success'])
             
-            # 按操作类型统计
-            operation_types = {}
-            for log in self.operation_log:
-                op_name = log['operation']
-                if op_name not in operation_types:
-                    operation_types[op_name] = {'total': 0, 'success': 0}
-                
-                operation_types[op_name]['total'] += 1
-                if log['success']:
-                    operation_types[op_name]['success'] += 1
+            # 按操作类型统计（返回副本，避免调用方修改内部计数）
+            operation_types = {name: dict(stats) for name, stats in self._op_types.items()}
             
             return {
                 'total_operations': total_operations,
-                'success_rate': success_operations / total_operations if total_operations > 0 else 0,
+                'success_rate': self._success_ops / total_operations if total_operations > 0 else 0,
                 'operation_types': operation_types,
-                'log_duration': str(datetime.now() - self.start_time).split('.')[0]
+                'log_duration': self._elapsed_str()
             }
     
     def update_with_game_data(self, score: int = None, credits: int = None, equipment_score: int = None):
@@ -414,29 +658,23 @@ class StatusMonitor:
             credits: 当前星穹
             equipment_score: 装备评分
         """
+        values = {'score': score, 'credits': credits, 'equipment_score': equipment_score}
+        
         with self.lock:
-            updated = False
-            
-            if score is not None and score != self.status['current_score']:
-                old_score = self.status['current_score']
-                self.status['current_score'] = score
-                self.logger.info(f"积分变化: {old_score} → {score} (变化: +{score - old_score})")
-                updated = True
-            
-            if credits is not None and credits != self.status['current_credits']:
-                old_credits = self.status['current_credits']
-                self.status['current_credits'] = credits
-                self.logger.info(f"星穹变化: {old_credits} → {credits} (变化: +{credits - old_credits})")
-                updated = True
-            
-            if equipment_score is not None and equipment_score != self.status['equipment_score']:
-                self.status['equipment_score'] = equipment_score
-                self.logger.info(f"装备评分: {equipment_score}")
-                updated = True
+            # 一次遍历收集所有变化的字段，合并为一次状态发布
+            changes = {}
+            diffs = {}
+            for arg_name, field in self._GAME_DATA_FIELDS:
+                value = values[arg_name]
+                if value is not None and value != self.status[field]:
+                    changes[field] = value
+                    diffs[arg_name] = (self.status[field], value)
             
-            if updated:
-                self.log_operation("状态更新", True, {
-                    'score': self.status['current_score'],
-                    'credits': self.status['current_credits'],
-                    'equipment_score': self.status['equipment_score']
-                })
+            if not changes:
+                return
+            self._publish_status(changes)
+            details = {arg_name: self.status[field] for arg_name, field in self._GAME_DATA_FIELDS}
+        
+        # 所有变化合并为一条日志；log_operation会再次获取锁，需在锁外调用
+        self.logger.info(self._CHANGES_FMT, diffs)
+        self.log_operation("状态更新", True, details)
@@ -6,14 +6,21 @@
 """
 
 import os
+import json
 import time
-import cv2
 import random
 import logging
+import cv2
 from adb_core import ADBCore
 from template_matcher import TemplateMatcher
 from config import get_config, validate_config
 
+# orjson为可选依赖，未安装时使用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # 获取配置
 CONFIG = get_config()
 
@@ -23,6 +30,45 @@ if not is_valid:
     print(f"配置验证失败: {message}")
     exit(1)
 
+def load_json(path):
+    """读取JSON文件
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        解析后的对象
+    """
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def dump_json(data, path):
+    """以缩进格式写入JSON文件
+    
+    Args:
+        data: 要保存的对象
+        path: 文件路径
+    """
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+# 模板在界面中的区域 (x, y, w, h)，生成模板时截取该区域，匹配时只在其附近搜索
+# 以下是示例坐标，实际使用时需要调整
+TEMPLATE_REGIONS = {
+    'money_war_entry': (500, 300, 300, 100),
+    'auto_battle': (1100, 600, 150, 50),
+    'settlement_confirm': (600, 650, 200, 60)
+}
+
 class StarRailMoneyWarBot:
     """星穹铁道货币战争机器人"""
     
@@ -36,14 +82,23 @@ class StarRailMoneyWarBot:
         self._setup_logger()
         
         # 初始化ADB核心
-        self.adb = ADBCore(logger=self.logger)
+        # 每次截图后只处理当前帧，不保留上一帧，截图可复用同一块输出缓冲区
+        self.adb = ADBCore(logger=self.logger, frame_slots=1)
         
         # 设置设备ID
         if device_id:
             self.adb.device_id = device_id
         
         # 初始化模板匹配器
-        self.matcher = TemplateMatcher(logger=self.logger)
+        self.matcher = TemplateMatcher(logger=self.logger, template_dir=CONFIG['template_dir'])
+        for template_name, region in TEMPLATE_REGIONS.items():
+            self.matcher.set_search_region(template_name, region)
+        
+        # 模板文件路径，在命令行参数覆盖template_dir之后计算一次
+        self.template_paths = {
+            name: os.path.join(CONFIG['template_dir'], f"{name}.png")
+            for name in CONFIG['templates']
+        }
         
         # 加载模板
         self._load_templates()
@@ -55,8 +110,9 @@ class StarRailMoneyWarBot:
     def _setup_logger(self):
         """配置日志"""
         # 创建日志目录
-        log_dir = "logs"
-        if not os.path.exists(log_dir):
+        log_file = CONFIG['log_file']
+        log_dir = os.path.dirname(log_file)
+        if log_dir and not os.path.exists(log_dir):
             os.makedirs(log_dir, exist_ok=True)
         
         # 配置日志格式
@@ -67,7 +123,7 @@ class StarRailMoneyWarBot:
             level=logging.INFO,
             format=log_format,
             handlers=[
-                logging.FileHandler(os.path.join(log_dir, "starrail_money_war.log")),
+                logging.FileHandler(log_file),
                 logging.StreamHandler()
             ]
         )
@@ -87,41 +143,40 @@ class StarRailMoneyWarBot:
         """加载模板"""
         self.logger.info("加载模板...")
         
-        for template_name, description in CONFIG['templates'].items():
-            template_path = os.path.join(CONFIG['template_dir'], f"{template_name}.png")
-            if os.path.exists(template_path):
+        existing = self._existing_template_files()
+        for template_name, template_path in self.template_paths.items():
+            if os.path.basename(template_path) in existing:
                 self.matcher.load_template(template_name, template_path)
             else:
                 self.logger.info(f"模板不存在: {template_path}，将在运行时自动生成")
     
+    def _existing_template_files(self):
+        """一次列出模板目录，代替逐个检查模板文件是否存在
+        
+        Returns:
+            模板目录中的文件名集合
+        """
+        try:
+            with os.scandir(CONFIG['template_dir']) as entries:
+                return {entry.name for entry in entries if entry.is_file()}
+        except OSError:
+            return set()
+    
     def _generate_templates(self):
         """生成模板"""
         self.logger.info("生成模板...")
         
         # 获取屏幕截图
-        screenshot_path = self.adb.screenshot()
-        if not screenshot_path:
-            self.logger.error("无法获取屏幕截图，模板生成失败")
-            return False
-        
-        image = cv2.imread(screenshot_path)
+        image = self.adb.screenshot_array()
         if image is None:
-            self.logger.error("无法加载截图，模板生成失败")
+            self.logger.error("无法获取屏幕截图，模板生成失败")
             return False
         
-        # 这里需要根据实际情况调整模板区域
-        # 以下是示例坐标，实际使用时需要调整
-        template_regions = {
-            'money_war_entry': (500, 300, 300, 100),
-            'auto_battle': (1100, 600, 150, 50),
-            'settlement_confirm': (600, 650, 200, 60)
-        }
-        
-        for template_name, region in template_regions.items():
-            self.matcher.save_template(template_name, image, region)
+        for template_name, region in TEMPLATE_REGIONS.items():
+            template_path = self.matcher.save_template(template_name, image, region)
             # 立即加载生成的模板
-            template_path = os.path.join(CONFIG['template_dir'], f"{template_name}.png")
-            self.matcher.load_template(template_name, template_path)
+            if template_path:
+                self.matcher.load_template(template_name, template_path)
         
         return True
     
@@ -158,6 +213,8 @@ class StarRailMoneyWarBot:
         # 这里简化处理，直接点击固定位置关闭弹窗
         self.logger.info("检查并关闭弹窗")
         self.adb.tap(*CONFIG['fixed_coords']['close_popup'])
+        # 界面切换处的随机延迟
+        time.sleep(random.uniform(0.5, 1.5))
     
     def _enter_money_war(self):
         """进入货币战争玩法"""
@@ -165,19 +222,14 @@ class StarRailMoneyWarBot:
         
         def _do_enter():
             # 1. 截图
-            screenshot_path = self.adb.screenshot()
-            if not screenshot_path:
-                return False
-            
-            # 2. 加载图像
-            image = cv2.imread(screenshot_path)
+            image = self.adb.screenshot_array()
             if image is None:
                 return False
             
-            # 3. 匹配货币战争入口
+            # 2. 匹配货币战争入口
             coords = self.matcher.match_template(image, 'money_war_entry', CONFIG['threshold'])
             if coords:
-                # 4. 点击入口
+                # 3. 点击入口
                 self.adb.tap(*coords)
                 time.sleep(2)  # 长延迟
                 return True
@@ -200,19 +252,14 @@ class StarRailMoneyWarBot:
         
         def _do_start_battle():
             # 1. 截图
-            screenshot_path = self.adb.screenshot()
-            if not screenshot_path:
-                return False
-            
-            # 2. 加载图像
-            image = cv2.imread(screenshot_path)
+            image = self.adb.screenshot_array()
             if image is None:
                 return False
             
-            # 3. 匹配自动战斗按钮
+            # 2. 匹配自动战斗按钮
             coords = self.matcher.match_template(image, 'auto_battle', CONFIG['threshold'])
             if coords:
-                # 4. 点击自动战斗
+                # 3. 点击自动战斗
                 self.adb.tap(*coords)
                 time.sleep(1.5)
                 return True
@@ -226,19 +273,29 @@ class StarRailMoneyWarBot:
         self.logger.info("等待战斗结束...")
         
         start_time = time.time()
+        last_frame_hash = None
+        grab_time = 0.0
+        
+        def _pause():
+            # 随机延迟，截图耗时计入延迟，两次截图的间隔就是随机延迟本身，不再额外叠加截图耗时
+            time.sleep(max(0.0, random.uniform(1, 3) - grab_time))
         
         while time.time() - start_time < 60:  # 最大等待60秒
             # 截图
-            screenshot_path = self.adb.screenshot()
-            if not screenshot_path:
+            shot_start = time.monotonic()
+            image = self.adb.screenshot_array()
+            grab_time = time.monotonic() - shot_start
+            if image is None:
                 continue
             
-            # 加载图像
-            image = cv2.imread(screenshot_path)
-            if image is None:
+            # 缩略图与上一帧完全相同时画面没有变化，跳过模板匹配和OCR
+            frame_hash = hash(cv2.resize(image, (32, 18), interpolation=cv2.INTER_AREA).tobytes())
+            if frame_hash == last_frame_hash:
+                _pause()
                 continue
+            last_frame_hash = frame_hash
             
-            # 检查是否显示结算界面
+            # 检查是否显示结算界面（模板匹配比OCR快，先匹配模板）
             coords = self.matcher.match_template(image, 'settlement_confirm', CONFIG['threshold'])
             if coords:
                 self.logger.info("战斗结束，进入结算界面")
@@ -259,8 +316,7 @@ class StarRailMoneyWarBot:
                 
                 continue
             
-            # 随机延迟
-            time.sleep(random.uniform(1, 3))
+            _pause()
         
         return False
     
@@ -270,19 +326,14 @@ class StarRailMoneyWarBot:
         
         def _do_settlement():
             # 1. 截图
-            screenshot_path = self.adb.screenshot()
-            if not screenshot_path:
-                return False
-            
-            # 2. 加载图像
-            image = cv2.imread(screenshot_path)
+            image = self.adb.screenshot_array()
             if image is None:
                 return False
             
-            # 3. 匹配结算确认按钮
+            # 2. 匹配结算确认按钮
             coords = self.matcher.match_template(image, 'settlement_confirm', CONFIG['threshold'])
             if coords:
-                # 4. 点击确认
+                # 3. 点击确认
                 self.adb.tap(*coords)
                 time.sleep(2)
                 return True
@@ -295,13 +346,9 @@ class StarRailMoneyWarBot:
         """返回入口界面"""
         self.logger.info("返回入口界面")
         
-        # 点击返回按钮
-        self.adb.tap(*CONFIG['fixed_coords']['back_button'])
-        time.sleep(1.5)
-        
-        # 再次点击返回，确保回到主界面
-        self.adb.tap(*CONFIG['fixed_coords']['back_button'])
-        time.sleep(1.5)
+        # 点击两次返回按钮确保回到主界面，点击和等待在一次shell调用中完成
+        x, y = CONFIG['fixed_coords']['back_button']
+        self.adb.tap_batch([(x, y, 1.5), (x, y, 1.5)])
         
         return True
     
@@ -371,9 +418,10 @@ class StarRailMoneyWarBot:
             return
         
         # 检查模板是否存在，不存在则生成
+        existing = self._existing_template_files()
         has_templates = all(
-            os.path.exists(os.path.join(CONFIG['template_dir'], f"{name}.png"))
-            for name in CONFIG['templates']
+            os.path.basename(path) in existing
+            for path in self.template_paths.values()
         )
         
         if not has_templates:
@@ -431,6 +479,7 @@ class StarRailMoneyWarBot:
             if save_progress:
                 self._save_progress(progress_file, cycle_count)
             self.running = False
+            self.adb.close()
             self.logger.info("=== 脚本已停止 ===")
     
     def _save_progress(self, progress_file, cycle_count):
@@ -440,14 +489,11 @@ class StarRailMoneyWarBot:
             progress_file: 进度保存文件路径
             cycle_count: 当前已运行周期数
         """
-        import json
-        
         try:
             # 读取现有进度
             progress = {}
             if os.path.exists(progress_file):
-                with open(progress_file, 'r', encoding='utf-8') as f:
-                    progress = json.load(f)
+                progress = load_json(progress_file)
             
             # 更新当前设备的进度
             device_id = self.adb.get_device_id()
@@ -459,8 +505,7 @@ class StarRailMoneyWarBot:
             }
             
             # 保存进度
-            with open(progress_file, 'w', encoding='utf-8') as f:
-                json.dump(progress, f, ensure_ascii=False, indent=2)
+            dump_json(progress, progress_file)
             
             self.logger.debug(f"进度已保存到: {progress_file}")
         except Exception as e:
@@ -474,7 +519,6 @@ class StarRailMoneyWarBot:
 def main():
     """主函数"""
     import argparse
-    import json
     
     # 创建参数解析器
     parser = argparse.ArgumentParser(description="《崩坏：星穹铁道》货币战争自动化脚本")
@@ -564,8 +608,7 @@ def main():
     progress = {}
     if args.resume:
         try:
-            with open(args.progress_file, 'r', encoding='utf-8') as f:
-                progress = json.load(f)
+            progress = load_json(args.progress_file)
             print(f"成功加载进度: {args.progress_file}")
         except Exception as e:
             print(f"加载进度失败: {str(e)}")
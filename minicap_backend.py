@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+minicap截图后端
+通过常驻的minicap进程和TCP连接持续接收JPEG帧，适合高频轮询屏幕的场景
+"""
+
+import os
+import re
+import socket
+import struct
+import subprocess
+import threading
+import time
+from typing import Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+# 设备端文件位置
+DEVICE_DIR = "/data/local/tmp"
+
+# `dumpsys input` 中的屏幕方向，0-3分别对应旋转0/90/180/270度
+_ORIENTATION_RE = re.compile(r'SurfaceOrientation:\s*(\d)')
+
+
+class MinicapBackend:
+    """minicap截图后端
+
+    需要预先准备minicap预编译文件，目录结构与minicap项目的输出一致：
+    minicap_dir/libs/<abi>/minicap 和 minicap_dir/jni/android-<sdk>/<abi>/minicap.so
+    """
+
+    def __init__(self, adb_path: str = "adb", device_id: str = "", minicap_dir: str = "minicap",
+                 port: int = 1313, logger=None):
+        """初始化minicap后端
+
+        Args:
+            adb_path: ADB工具路径
+            device_id: 设备ID
+            minicap_dir: 本地minicap预编译文件目录
+            port: 本地转发端口
+            logger: 日志对象
+        """
+        self.adb_path = adb_path
+        self.device_id = device_id
+        self.minicap_dir = minicap_dir
+        self.port = port
+        self.logger = logger
+
+        self._proc = None
+        self._sock = None
+        self._reader = None
+        self._running = False
+
+        # 最新一帧JPEG数据，minicap只在画面变化时推送新帧
+        self._frame = None
+        self._frame_id = 0
+        self._frame_cond = threading.Condition()
+
+    @property
+    def _base_argv(self) -> List[str]:
+        """ADB命令前缀"""
+        if self.device_id:
+            return [self.adb_path, "-s", self.device_id]
+        return [self.adb_path]
+
+    def _adb(self, args: List[str], timeout: int = 10) -> Optional[str]:
+        """运行一次性ADB命令
+
+        Args:
+            args: ADB参数列表
+            timeout: 超时时间（秒）
+
+        Returns:
+            命令输出，失败返回None
+        """
+        try:
+            result = subprocess.run(self._base_argv + args, capture_output=True, text=True, timeout=timeout)
+        except Exception as e:
+            self.logger.error(f"minicap ADB命令出错: {str(e)}")
+            return None
+
+        if result.returncode != 0:
+            self.logger.error(f"minicap ADB命令失败: {' '.join(args)}: {result.stderr.strip()}")
+            return None
+
+        return result.stdout.strip()
+
+    def is_running(self) -> bool:
+        """检查帧读取是否在运行"""
+        return self._running
+
+    def start(self, width: int, height: int) -> bool:
+        """部署并启动minicap，建立帧连接
+
+        Args:
+            width: 屏幕自然方向的宽度（`wm size` 的结果）
+            height: 屏幕自然方向的高度
+
+        Returns:
+            成功返回True，失败返回False
+        """
+        abi = self._adb(["shell", "getprop", "ro.product.cpu.abi"])
+        sdk = self._adb(["shell", "getprop", "ro.build.version.sdk"])
+        if not abi or not sdk:
+            return False
+
+        binary = os.path.join(self.minicap_dir, "libs", abi, "minicap")
+        library = os.path.join(self.minicap_dir, "jni", f"android-{sdk}", abi, "minicap.so")
+        for path in (binary, library):
+            if not os.path.exists(path):
+                self.logger.error(f"minicap文件不存在: {path}")
+                return False
+
+        for path in (binary, library):
+            if self._adb(["push", path, f"{DEVICE_DIR}/"], timeout=30) is None:
+                return False
+        self._adb(["shell", "chmod", "755", f"{DEVICE_DIR}/minicap"])
+
+        # 启动minicap，保持原始分辨率；按当前屏幕方向旋转输出，与screencap的坐标一致
+        projection = f"{width}x{height}@{width}x{height}/{self._display_rotation()}"
+        self._proc = subprocess.Popen(
+            self._base_argv + ["shell", f"LD_LIBRARY_PATH={DEVICE_DIR}", f"{DEVICE_DIR}/minicap", "-P", projection],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        if self._adb(["forward", f"tcp:{self.port}", "localabstract:minicap"]) is None:
+            self.stop()
+            return False
+
+        # minicap启动需要一点时间，连接失败时稍后重试
+        for _ in range(10):
+            try:
+                self._sock = socket.create_connection(("127.0.0.1", self.port), timeout=5)
+                self._read_banner()
+                break
+            except (OSError, ConnectionError):
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+                time.sleep(0.3)
+        else:
+            self.logger.error("无法连接minicap")
+            self.stop()
+            return False
+
+        self._running = True
+        self._reader = threading.Thread(target=self._read_loop, daemon=True)
+        self._reader.start()
+        self.logger.info(f"minicap已启动: {projection}")
+        return True
+
+    def _display_rotation(self) -> int:
+        """查询当前屏幕旋转角度
+
+        Returns:
+            0/90/180/270，查询失败返回0
+        """
+        output = self._adb(["shell", "dumpsys input | grep SurfaceOrientation"])
+        match = _ORIENTATION_RE.search(output or "")
+        return int(match.group(1)) * 90 if match else 0
+
+    def _recv_exact(self, size: int) -> bytes:
+        """从连接中读取指定长度的数据
+
+        Raises:
+            ConnectionError: 连接已关闭
+        """
+        buf = bytearray(size)
+        view = memoryview(buf)
+        received = 0
+        while received < size:
+            n = self._sock.recv_into(view[received:])
+            if n == 0:
+                raise ConnectionError("minicap连接已关闭")
+            received += n
+        return bytes(buf)
+
+    def _read_banner(self):
+        """读取连接建立后的banner（版本、长度、pid、尺寸等）"""
+        header = self._recv_exact(2)
+        banner_length = header[1]
+        self._recv_exact(banner_length - 2)
+
+    def _read_loop(self):
+        """持续读取帧：4字节小端长度 + JPEG数据"""
+        try:
+            while self._running:
+                frame_size, = struct.unpack('<I', self._recv_exact(4))
+                frame = self._recv_exact(frame_size)
+                with self._frame_cond:
+                    self._frame = frame
+                    self._frame_id += 1
+                    self._frame_cond.notify_all()
+        except (OSError, ConnectionError) as e:
+            if self._running:
+                self.logger.error(f"minicap帧读取中断: {str(e)}")
+        finally:
+            self._running = False
+            with self._frame_cond:
+                self._frame_cond.notify_all()
+
+    def get_frame(self, timeout: float = 2.0, grayscale: bool = False) -> Optional[np.ndarray]:
+        """获取最新一帧
+
+        Args:
+            timeout: 尚未收到任何帧时的等待时间（秒）
+            grayscale: 是否直接解码为灰度图
+
+        Returns:
+            BGR图像数组，失败返回None
+        """
+        with self._frame_cond:
+            if self._frame is None:
+                self._frame_cond.wait_for(lambda: self._frame is not None or not self._running, timeout)
+            frame = self._frame
+
+        if frame is None:
+            return None
+
+        flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+        return cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), flags)
+
+    def frames(self, timeout: float = 5.0) -> Iterator[np.ndarray]:
+        """逐帧迭代，每次等待新帧到达
+
+        Args:
+            timeout: 等待新帧的超时时间（秒）
+
+        Yields:
+            BGR图像数组
+        """
+        last_id = 0
+        while self._running:
+            with self._frame_cond:
+                if not self._frame_cond.wait_for(lambda: self._frame_id != last_id or not self._running, timeout):
+                    return
+                frame, last_id = self._frame, self._frame_id
+
+            if frame is None:
+                return
+
+            image = cv2.imdecode(np.frombuffer(frame, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is not None:
+                yield image
+
+    def stop(self):
+        """停止minicap并清理端口转发"""
+        self._running = False
+
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            self._proc = None
+            self._adb(["forward", "--remove", f"tcp:{self.port}"])
+
+        self._frame = None
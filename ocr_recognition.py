@@ -6,6 +6,7 @@ OCR识别模块
 """
 
 import os
+import re
 import time
 from typing import Optional, List, Dict, Tuple
 
@@ -153,6 +154,20 @@ class OCRRecognizer:
             self.logger.error(f"OCR识别失败: {str(e)}", exc_info=True)
             return []
     
+    def recognize_batch(self, images: List) -> List[List[Dict]]:
+        """批量识别多张图像
+        
+        PaddleOCR和Tesseract都没有多图接口，这里逐张识别，
+        但引擎只初始化一次，调用方也只需一次调用。
+        
+        Args:
+            images: 图像列表（路径或numpy数组）
+            
+        Returns:
+            与输入顺序对应的识别结果列表
+        """
+        return [self.recognize(image) for image in images]
+    
     def _preprocess_for_ocr(self, image, region: Tuple[int, int, int, int] = None):
         """OCR前的图像预处理
         
@@ -241,10 +256,7 @@ class OCRRecognizer:
             # 配置Tesseract参数
             config = f'--oem 3 --psm 6 -l {self.config.ocr_language}'
             
-            # 使用pytesseract识别
-            text = pytesseract.image_to_string(image, config=config)
-            
-            # 使用image_to_data获取置信度
+            # image_to_data同时给出文本和置信度，无需再单独调用image_to_string
             data = pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
             
             for i in range(len(data['text'])):
@@ -287,8 +299,6 @@ class OCRRecognizer:
         Returns:
             识别的数字，失败返回None
         """
-        import re
-        
         text = self.recognize_single_line(image, region)
         if text:
             # 提取数字
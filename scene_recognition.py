@@ -5,11 +5,16 @@
 负责识别游戏界面状态和交互点
 """
 
+from __future__ import annotations
+
 import os
-import cv2
-import numpy as np
+import re
 from enum import Enum, auto
-from typing import Optional, Tuple, Dict
+from typing import TYPE_CHECKING, Optional, Tuple, Dict
+
+# numpy只用于类型注解，仅导入SceneType时无需加载numpy
+if TYPE_CHECKING:
+    import numpy as np
 
 class SceneType(Enum):
     """游戏场景类型"""
@@ -190,7 +195,6 @@ class SceneRecognizer:
             # 检查文本中是否包含积分相关关键词
             if any(keyword in text for keyword in ['积分', '分数', 'point', 'score']):
                 # 提取数字
-                import re
                 numbers = re.findall(r'\d+', text)
                 if numbers:
                     return int(numbers[0])
@@ -207,7 +211,6 @@ class SceneRecognizer:
         all_numbers = []
         for result in ocr_results:
             text = result['text']
-            import re
             numbers = re.findall(r'\d+', text)
             all_numbers.extend([int(num) for num in numbers])
         
@@ -250,7 +253,6 @@ class SceneRecognizer:
             text = result['text']
             
             # 提取物品和数量
-            import re
             item_patterns = [
                 r'(\w+)\s*(\d+)',  # 物品名 数量
                 r'获得\s*(\w+)\s*(\d+)',  # 获得 物品名 数量
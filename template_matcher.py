@@ -11,23 +11,37 @@ import os
 import time
 from typing import Optional, Tuple
 
+# 源图像面积达到该值时使用两级匹配：先在1/2尺寸上粗定位，再在原尺寸局部精确匹配
+PYRAMID_MIN_AREA = 1280 * 720
+# 粗匹配阶段相对阈值的放宽量，低于(阈值 - 放宽量)直接判定不匹配
+PYRAMID_COARSE_MARGIN = 0.15
+# 两级匹配要求模板边长不小于该值，保证缩小后仍有足够细节
+PYRAMID_MIN_TEMPLATE = 20
+# 限定搜索区域时向四周扩展的像素数，容忍界面元素的轻微偏移
+SEARCH_REGION_MARGIN = 50
+
 class TemplateMatcher:
     """模板匹配类"""
     
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, template_dir: str = "templates"):
         """初始化模板匹配器
         
         Args:
             logger: 日志对象
+            template_dir: 模板目录，应与配置中的template_dir一致
         """
         self.logger = logger
         self.templates = {}
-        self.template_dir = "templates"
+        # 1/2尺寸模板，加载时生成，用于两级匹配的粗定位
+        self._half_templates = {}
+        # 模板的搜索区域 (x0, y0, x1, y1)，未设置的模板在整张图中搜索
+        self.search_regions = {}
+        self.template_dir = template_dir
         
         # 创建模板目录
         if not os.path.exists(self.template_dir):
-            os.makedirs(self.template_dir)
-            self.log("创建模板目录: templates", "INFO")
+            os.makedirs(self.template_dir, exist_ok=True)
+            self.log(f"创建模板目录: {self.template_dir}", "INFO")
     
     def log(self, message: str, level: str = "INFO"):
         """日志记录
@@ -73,6 +87,10 @@ class TemplateMatcher:
                 # 仍然加载，但给出警告
             
             self.templates[name] = template
+            if min(template.shape[:2]) >= PYRAMID_MIN_TEMPLATE:
+                self._half_templates[name] = cv2.resize(template, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+            else:
+                self._half_templates.pop(name, None)
             self.log(f"加载模板成功: {name} ({template.shape[1]}x{template.shape[0]})")
             return True
         except Exception as e:
@@ -169,6 +187,17 @@ class TemplateMatcher:
             self.log(f"保存模板出错: {str(e)}")
             return ""
     
+    def set_search_region(self, name: str, region: Tuple[int, int, int, int], margin: int = SEARCH_REGION_MARGIN):
+        """限定模板的搜索区域，适用于位置固定的界面元素
+        
+        Args:
+            name: 模板名称
+            region: 模板所在区域 (x, y, w, h)
+            margin: 向四周扩展的像素数
+        """
+        x, y, w, h = region
+        self.search_regions[name] = (max(0, x - margin), max(0, y - margin), x + w + margin, y + h + margin)
+    
     def match_template(self, image: np.ndarray, template_name: str, threshold: float = 0.8) -> Optional[Tuple[int, int]]:
         """模板匹配
         
@@ -187,6 +216,18 @@ class TemplateMatcher:
                 return None
             
             template = self.templates[template_name]
+            h, w = template.shape[:2]
+            
+            # 位置固定的模板只在搜索区域内匹配，区域放不下模板时退回整图
+            x0 = y0 = 0
+            region = self.search_regions.get(template_name)
+            if region is not None:
+                rx0, ry0, rx1, ry1 = region
+                rx1 = min(rx1, image.shape[1])
+                ry1 = min(ry1, image.shape[0])
+                if rx1 - rx0 >= w and ry1 - ry0 >= h:
+                    image = image[ry0:ry1, rx0:rx1]
+                    x0, y0 = rx0, ry0
             
             # 将源图像转为灰度图
             if len(image.shape) == 3:
@@ -195,18 +236,14 @@ class TemplateMatcher:
                 gray_image = image
             
             # 模板匹配
-            result = cv2.matchTemplate(gray_image, template, cv2.TM_CCOEFF_NORMED)
-            
-            # 查找匹配位置
-            min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+            max_val, max_loc = self._locate(gray_image, template_name, threshold)
             
             self.log(f"模板匹配: {template_name}, 匹配度: {max_val:.4f}, 阈值: {threshold}")
             
             if max_val >= threshold:
-                # 计算中心点坐标
-                h, w = template.shape[:2]
-                center_x = max_loc[0] + w // 2
-                center_y = max_loc[1] + h // 2
+                # 计算中心点坐标（换算回整图坐标）
+                center_x = x0 + max_loc[0] + w // 2
+                center_y = y0 + max_loc[1] + h // 2
                 
                 self.log(f"匹配成功: {template_name}，坐标: ({center_x}, {center_y})")
                 return (center_x, center_y)
@@ -216,6 +253,47 @@ class TemplateMatcher:
             self.log(f"模板匹配出错: {str(e)}")
             return None
     
+    def _locate(self, gray_image: np.ndarray, template_name: str, threshold: float) -> Tuple[float, Tuple[int, int]]:
+        """在灰度图中查找模板的最佳匹配位置
+        
+        大图先在1/2尺寸上粗定位，再只在候选位置附近做原尺寸匹配，
+        计算量约为整图匹配的1/16。
+        
+        Args:
+            gray_image: 灰度源图像
+            template_name: 模板名称
+            threshold: 匹配阈值
+            
+        Returns:
+            (匹配度, 左上角坐标)
+        """
+        template = self.templates[template_name]
+        half = self._half_templates.get(template_name)
+        img_h, img_w = gray_image.shape[:2]
+        
+        if half is None or img_h * img_w < PYRAMID_MIN_AREA:
+            result = cv2.matchTemplate(gray_image, template, cv2.TM_CCOEFF_NORMED)
+            _, max_val, _, max_loc = cv2.minMaxLoc(result)
+            return max_val, max_loc
+        
+        # 粗定位
+        small = cv2.resize(gray_image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        result = cv2.matchTemplate(small, half, cv2.TM_CCOEFF_NORMED)
+        _, coarse_val, _, coarse_loc = cv2.minMaxLoc(result)
+        if coarse_val < threshold - PYRAMID_COARSE_MARGIN:
+            return coarse_val, (coarse_loc[0] * 2, coarse_loc[1] * 2)
+        
+        # 在粗定位结果周围几个像素的窗口内精确匹配
+        h, w = template.shape[:2]
+        pad = 4
+        x0 = max(0, coarse_loc[0] * 2 - pad)
+        y0 = max(0, coarse_loc[1] * 2 - pad)
+        x1 = min(img_w, coarse_loc[0] * 2 + w + pad)
+        y1 = min(img_h, coarse_loc[1] * 2 + h + pad)
+        result = cv2.matchTemplate(gray_image[y0:y1, x0:x1], template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        return max_val, (x0 + max_loc[0], y0 + max_loc[1])
+    
     def match_all_templates(self, image: np.ndarray, threshold: float = 0.8) -> dict:
         """匹配所有模板
         
@@ -228,6 +306,10 @@ class TemplateMatcher:
         """
         results = {}
         
+        # 只转换一次灰度图，各模板共用
+        if len(image.shape) == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        
         for template_name in self.templates:
             match_result = self.match_template(image, template_name, threshold)
             if match_result:
@@ -296,4 +378,5 @@ class TemplateMatcher:
         """清除所有模板
         """
         self.templates.clear()
+        self._half_templates.clear()
         self.log("清除所有模板")
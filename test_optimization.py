@@ -46,4 +46,26 @@ try:
 except Exception as e:
     print(f"   模板匹配模块测试失败: {str(e)}")
 
+# 测试日志轮转大小（中文日志按字节计算）
+print("\n5. 测试日志轮转大小:")
+try:
+    import os
+    import tempfile
+    from logging_monitor import BufferedRotatingFileHandler
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_path = os.path.join(tmp_dir, "t.log")
+        handler = BufferedRotatingFileHandler(log_path, maxBytes=100_000, backupCount=3, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        record = logging.LogRecord("test", logging.INFO, __file__, 0, "操作: 状态更新，状态: 成功" * 5, None, None)
+        for _ in range(3000):
+            handler.emit(record)
+        handler.close()
+        
+        sizes = [os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)]
+        assert len(sizes) > 1, f"未发生轮转: {sizes}"
+        assert max(sizes) <= 100_000, f"日志文件超过maxBytes: {sizes}"
+    print(f"   日志轮转测试成功: {sorted(sizes)}")
+except Exception as e:
+    print(f"   日志轮转测试失败: {str(e)}")
+
 print("\n=== 测试完成 ===")